@@ -1 +1,5 @@
+import os
+import dotenv
 
+# Load backend/.env once, before any module reads its settings; variables already set in the environment win
+dotenv.load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"))
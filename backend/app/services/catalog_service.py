@@ -0,0 +1,275 @@
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.product_result import ProductResult
+
+logger = logging.getLogger(__name__)
+
+# Local product catalog built from every shopping result we have fetched
+CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "true").lower() in ("1", "true", "yes")
+CATALOG_MAX_PRODUCTS = int(os.getenv("CATALOG_MAX_PRODUCTS", "20000"))
+# Products not seen in a live result for this long (seconds) are stale and no longer served
+CATALOG_MAX_AGE = float(os.getenv("CATALOG_MAX_AGE", "86400"))
+# A query is answered locally only when at least CATALOG_MIN_RESULTS products score >= CATALOG_MIN_SCORE
+CATALOG_MIN_SCORE = float(os.getenv("CATALOG_MIN_SCORE", "0.4"))
+CATALOG_MIN_RESULTS = int(os.getenv("CATALOG_MIN_RESULTS", "5"))
+# Newly ingested products become searchable at the next index rebuild, at most this often (seconds)
+CATALOG_REBUILD_INTERVAL = float(os.getenv("CATALOG_REBUILD_INTERVAL", "30"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Words that appear in most listings (or in the query suffix) and carry no signal
+_STOPWORDS = {"a", "an", "and", "the", "for", "with", "in", "of", "by", "to", "on", "fashion", "clothing"}
+
+def _log_rebuild_failure(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Catalog index rebuild failed: %s", task.exception())
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+class ProductCatalog:
+    """
+    In-process product store deduplicated by product link, with a TF-IDF index
+    over titles for cosine similarity lookups.
+
+    The index is an inverted list of L2-normalized TF-IDF weights held in NumPy
+    arrays. It is rebuilt in the background on the first lookup after new
+    products are ingested (throttled by rebuild_interval), so a query costs one
+    vectorized scatter-add per query term plus a top-k partition.
+    """
+
+    def __init__(self, name: str, max_products: int = 20000, max_age: float = 86400.0, rebuild_interval: float = 30.0):
+        self.name = name
+        self.max_products = max_products
+        self.max_age = max_age
+        self.rebuild_interval = rebuild_interval
+
+        # link -> (product, last update time); ordered by last update so the oldest are evicted first.
+        # The products are the shared (immutable by convention) objects from the shopping cache.
+        self._products: "OrderedDict[str, Tuple[ProductResult, float]]" = OrderedDict()
+        # Guards the products and the index references; never held while building an index
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_task: Optional[asyncio.Future] = None
+        self._dirty = False
+        self._last_rebuild = 0.0
+
+        # Index state (see _rebuild); a snapshot, so evictions don't invalidate it
+        self._indexed: List[ProductResult] = []
+        self._updated_at = np.zeros(0)
+        self._vocabulary: Dict[str, int] = {}
+        self._idf = np.zeros(0)
+        self._postings_start = np.zeros(1, dtype=np.int64)
+        self._postings_docs = np.zeros(0, dtype=np.int64)
+        self._postings_weights = np.zeros(0, dtype=np.float32)
+
+        self.ingested = 0
+        self.lookups = 0
+        self.local_hits = 0
+        self.evictions = 0
+        self.rebuilds = 0
+        self.last_rebuild_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def ingest(self, products: List[ProductResult]) -> None:
+        """
+        Add or refresh products from a live search.
+
+        Args:
+            products: Normalized shopping results; entries without a link or title are skipped
+        """
+        now = time.time()
+        with self._lock:
+            for product in products:
+                link = product.link
+                if not link or not product.title:
+                    continue
+                self._products[link] = (product, now)
+                self._products.move_to_end(link)
+                self.ingested += 1
+            while len(self._products) > self.max_products:
+                self._products.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+
+    def needs_rebuild(self) -> bool:
+        if not self._dirty:
+            return False
+        return not self._indexed or time.monotonic() - self._last_rebuild >= self.rebuild_interval
+
+    def rebuild(self) -> None:
+        """
+        Rebuild the TF-IDF index from the current products. Blocking; run it off the event loop.
+
+        The index is built from a snapshot without holding the product lock, so
+        ingest() isn't blocked meanwhile, and swapped in at the end. Concurrent
+        calls wait for the running rebuild and then return if nothing changed.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                if not self._dirty and self._last_rebuild:
+                    return
+                entries = list(self._products.values())
+                # Products ingested from here on mark the catalog dirty again
+                self._dirty = False
+            started = time.perf_counter()
+            try:
+                index = self._build_index(entries)
+            except BaseException:
+                with self._lock:
+                    self._dirty = True
+                raise
+            with self._lock:
+                (self._indexed, self._updated_at, self._vocabulary, self._idf,
+                 self._postings_start, self._postings_docs, self._postings_weights) = index
+                self._last_rebuild = time.monotonic()
+            self.rebuilds += 1
+            self.last_rebuild_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    @staticmethod
+    def _build_index(entries: List[Tuple[ProductResult, float]]) -> Tuple:
+        indexed = [product for product, _ in entries]
+        vocabulary: Dict[str, int] = {}
+        rows: List[int] = []
+        columns: List[int] = []
+        counts: List[int] = []
+        for row, product in enumerate(indexed):
+            for token, count in Counter(tokenize(product.title)).items():
+                rows.append(row)
+                columns.append(vocabulary.setdefault(token, len(vocabulary)))
+                counts.append(count)
+
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        document_count = len(indexed)
+        document_frequency = np.bincount(columns, minlength=len(vocabulary))
+        idf = np.log((1 + document_count) / (1 + document_frequency)) + 1.0
+
+        # Sublinear TF-IDF, L2-normalized per product so dot products are cosines
+        weights = (1.0 + np.log(np.asarray(counts, dtype=np.float64))) * idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=document_count))
+        weights /= norms[rows]
+
+        # Group the weights by term into postings lists
+        order = np.argsort(columns, kind="stable")
+        postings_start = np.concatenate(([0], np.cumsum(document_frequency))).astype(np.int64)
+        updated_at = np.array([updated_at for _, updated_at in entries])
+        return indexed, updated_at, vocabulary, idf, postings_start, rows[order], weights[order].astype(np.float32)
+
+    def search(self, query: str, k: int = 10, min_score: float = 0.0) -> List[Tuple[ProductResult, float]]:
+        """
+        Return up to k fresh products whose titles are most similar to the query,
+        from the current index (see rebuild).
+
+        Args:
+            query: Free-text product description
+            k: Maximum number of products
+            min_score: Minimum cosine similarity (0-1)
+
+        Returns:
+            List[Tuple[ProductResult, float]]: (product, score) pairs ordered by descending similarity
+        """
+        # Arrays are replaced, never modified, by a rebuild, so a consistent set of references is enough
+        with self._lock:
+            indexed, updated_at, vocabulary, idf = self._indexed, self._updated_at, self._vocabulary, self._idf
+            postings_start, postings_docs, postings_weights = self._postings_start, self._postings_docs, self._postings_weights
+        if not indexed:
+            return []
+
+        query_counts = Counter(tokenize(query))
+        known = [token for token in query_counts if token in vocabulary]
+        if not known:
+            return []
+        term_ids = np.array([vocabulary[token] for token in known])
+        query_weights = (1.0 + np.log([query_counts[token] for token in known])) * idf[term_ids]
+
+        # Words no product contains still count towards the query norm (with the
+        # idf of an unseen term), so partial matches score lower than full ones
+        unseen_idf = math.log(1 + len(indexed)) + 1.0
+        unseen = [(1.0 + math.log(count)) * unseen_idf for token, count in query_counts.items() if token not in vocabulary]
+        query_weights /= math.sqrt(float(np.sum(query_weights ** 2)) + sum(weight ** 2 for weight in unseen))
+
+        scores = np.zeros(len(indexed), dtype=np.float32)
+        for term, weight in zip(term_ids, query_weights):
+            start, end = postings_start[term], postings_start[term + 1]
+            scores[postings_docs[start:end]] += weight * postings_weights[start:end]
+
+        scores[time.time() - updated_at > self.max_age] = 0.0
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        return [
+            (indexed[index], round(float(scores[index]), 4))
+            for index in candidates
+            if scores[index] > 0 and scores[index] >= min_score
+        ]
+
+    async def lookup(self, query: str, k: int = 10) -> Optional[List[ProductResult]]:
+        """
+        Answer a product search locally when the catalog has enough good matches.
+
+        A due rebuild runs in a worker thread, one at a time; lookups meanwhile
+        use the previous index and only wait when there is none yet.
+
+        Args:
+            query: Free-text product description
+            k: Number of products wanted
+
+        Returns:
+            List[ProductResult]: Matching products, or None when the caller should query SerpAPI
+        """
+        if not CATALOG_ENABLED:
+            return None
+        self.lookups += 1
+        if self.needs_rebuild():
+            if self._rebuild_task is None or self._rebuild_task.done():
+                # Rebuilding a large catalog takes long enough to stall other requests
+                self._rebuild_task = asyncio.ensure_future(asyncio.to_thread(self.rebuild))
+                self._rebuild_task.add_done_callback(_log_rebuild_failure)
+            if not self._indexed:
+                await asyncio.shield(self._rebuild_task)
+        matches = self.search(query, k=k, min_score=CATALOG_MIN_SCORE)
+        if len(matches) < min(k, CATALOG_MIN_RESULTS):
+            return None
+        self.local_hits += 1
+        return [product for product, _ in matches]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return catalog size, index and hit-rate counters for monitoring.
+        """
+        return {
+            "name": self.name,
+            "enabled": CATALOG_ENABLED,
+            "products": len(self._products),
+            "max_products": self.max_products,
+            "vocabulary": len(self._vocabulary),
+            "ingested": self.ingested,
+            "evictions": self.evictions,
+            "lookups": self.lookups,
+            "local_hits": self.local_hits,
+            "hit_ratio": round(self.local_hits / self.lookups, 4) if self.lookups else 0.0,
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": self.last_rebuild_ms
+        }
+
+product_catalog = ProductCatalog(
+    "products",
+    max_products=CATALOG_MAX_PRODUCTS,
+    max_age=CATALOG_MAX_AGE,
+    rebuild_interval=CATALOG_REBUILD_INTERVAL
+)
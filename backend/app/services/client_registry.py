@@ -0,0 +1,104 @@
+import os
+import inspect
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+def require_env(name: str) -> str:
+    """
+    Return a required environment variable.
+
+    Raises:
+        ValueError: If the variable is unset or empty
+    """
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"{name} environment variable is not set")
+    return value
+
+class ClientRegistry:
+    """
+    SDK clients built on first use instead of at import time.
+
+    Services register a factory per provider; the factory does the slow SDK
+    import and reads its credentials only when the client is first needed,
+    so the app imports quickly and a worker without some provider's key
+    still starts. Safe to call from worker threads.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """
+        Return the client for a provider, building it on first use.
+
+        Args:
+            name: Provider name, e.g. "openai"
+
+        Returns:
+            The provider's client
+
+        Raises:
+            KeyError: If no factory is registered for the provider
+            ValueError: If the provider's credentials are missing
+        """
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = self._factories[name]()
+                logger.info("Initialized %s client", name)
+            return self._clients[name]
+
+    def preload(self, names: Iterable[str]) -> List[str]:
+        """
+        Build the named clients ahead of the first request. Providers that
+        fail to initialize (e.g. missing keys) are logged and skipped; they
+        raise again when a request actually needs them.
+
+        Args:
+            names: Provider names
+
+        Returns:
+            List[str]: Providers that are ready
+        """
+        ready = []
+        for name in names:
+            try:
+                self.get(name)
+                ready.append(name)
+            except Exception as e:
+                logger.warning("Could not initialize %s client: %s", name, e)
+        return ready
+
+    def initialized(self) -> List[str]:
+        return list(self._clients)
+
+    async def aclose(self) -> None:
+        """
+        Close every client that was built, releasing their connection pools.
+        """
+        with self._lock:
+            built = list(self._clients.items())
+            self._clients.clear()
+        for name, client in built:
+            close = getattr(client, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning("Error closing %s client: %s", name, e)
+
+clients = ClientRegistry()
@@ -0,0 +1,81 @@
+import os
+import httpx
+import logging
+from typing import Optional
+
+# Connection pool settings for outbound API calls
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30.0"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30.0"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10.0"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+def _http2_available() -> bool:
+    """
+    Check whether the optional h2 package needed for HTTP/2 is installed.
+    """
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Build a keep-alive AsyncClient using the configured pool limits.
+
+    Returns:
+        httpx.AsyncClient: A new client; the caller is responsible for closing it
+    """
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    http2 = HTTP2_ENABLED and _http2_available()
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+async def init_http_client() -> httpx.AsyncClient:
+    """
+    Create the application-scoped client. Called from the FastAPI lifespan hook.
+
+    Returns:
+        httpx.AsyncClient: The shared client
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+        logger.info(
+            "Initialized shared HTTP client (http2=%s, max_connections=%d, max_keepalive=%d)",
+            HTTP2_ENABLED and _http2_available(), HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+    return _client
+
+async def close_http_client() -> None:
+    """
+    Close the application-scoped client and release its pooled connections.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        logger.info("Closed shared HTTP client")
+    _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared client, creating it on first use when the lifespan hook
+    has not run (e.g. when a service is used from a standalone script).
+
+    Returns:
+        httpx.AsyncClient: The shared client
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
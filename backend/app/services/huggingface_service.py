@@ -1,61 +1,268 @@
 import os
-import dotenv
-from huggingface_hub import InferenceClient
-from typing import Dict
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from app.services.client_registry import clients, require_env
+from app.utils.cache import TTLCache
+from app.utils.single_flight import SingleFlight
+from app.utils.metrics import PAYLOAD_BYTES, UPSTREAM_REQUESTS, track_stage
 from io import BytesIO
+from PIL import Image, features
 import time
 
-# Load environment variables
-dotenv.load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
+logger = logging.getLogger(__name__)
 
-# Initialize HuggingFace client
-api_key = os.getenv("HUGGINGFACE_API_KEY")
-if not api_key:
-    raise ValueError("HUGGINGFACE_API_KEY environment variable is not set")
+# A full text-to-image URL (e.g. a dedicated endpoint or the benchmark stand-in) replaces the hosted model
+HF_INFERENCE_BASE_URL = os.getenv("HF_INFERENCE_BASE_URL", "")
 
-client = InferenceClient(
-    provider="nebius",
-    api_key=api_key,
-)
+def _create_huggingface_client():
+    # Imported here so workers that never generate images don't pay for huggingface_hub
+    from huggingface_hub import InferenceClient
+    return InferenceClient(
+        provider="hf-inference" if HF_INFERENCE_BASE_URL else "nebius",
+        api_key=require_env("HUGGINGFACE_API_KEY"),
+    )
+
+clients.register("huggingface", _create_huggingface_client)
+
+STYLE_IMAGE_MODEL = HF_INFERENCE_BASE_URL or "black-forest-labs/FLUX.1-dev"
+
+# Delivery encoding: WebP by default, AVIF when requested and supported by the installed Pillow
+STYLE_IMAGE_FORMAT = os.getenv("STYLE_IMAGE_FORMAT", "WEBP").upper()
+if STYLE_IMAGE_FORMAT == "AVIF" and not features.check("avif"):
+    logger.warning("AVIF encoding is not available in this Pillow build, using WEBP")
+    STYLE_IMAGE_FORMAT = "WEBP"
+if STYLE_IMAGE_FORMAT not in ("WEBP", "AVIF"):
+    STYLE_IMAGE_FORMAT = "WEBP"
+STYLE_IMAGE_MIME_TYPE = f"image/{STYLE_IMAGE_FORMAT.lower()}"
+STYLE_IMAGE_MAX_DIMENSION = int(os.getenv("STYLE_IMAGE_MAX_DIMENSION", "1024"))
+STYLE_IMAGE_TARGET_BYTES = int(os.getenv("STYLE_IMAGE_TARGET_BYTES", "150000"))
+STYLE_IMAGE_QUALITY = int(os.getenv("STYLE_IMAGE_QUALITY", "80"))
+STYLE_IMAGE_MIN_QUALITY = int(os.getenv("STYLE_IMAGE_MIN_QUALITY", "40"))
+
+# Generated images are cached by prompt hash in memory and, optionally, as files on disk
+STYLE_IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("STYLE_IMAGE_CACHE_MAX_ENTRIES", "256"))
+STYLE_IMAGE_CACHE_TTL = float(os.getenv("STYLE_IMAGE_CACHE_TTL", "604800"))
+STYLE_IMAGE_CACHE_DIR = os.getenv("STYLE_IMAGE_CACHE_DIR", "")
+# Files older than the TTL are deleted, then the oldest until the directory fits the budget
+STYLE_IMAGE_CACHE_DIR_MAX_BYTES = int(os.getenv("STYLE_IMAGE_CACHE_DIR_MAX_BYTES", str(512 * 1024 * 1024)))
+STYLE_IMAGE_CACHE_PRUNE_INTERVAL = float(os.getenv("STYLE_IMAGE_CACHE_PRUNE_INTERVAL", "600"))
+SAVE_DEBUG_IMAGES = os.getenv("SAVE_DEBUG_IMAGES", "false").lower() in ("1", "true", "yes")
+
+style_image_cache = TTLCache("style_images", max_entries=STYLE_IMAGE_CACHE_MAX_ENTRIES, ttl=STYLE_IMAGE_CACHE_TTL)
+
+# Concurrent requests for the same prompt share one generation
+image_flight = SingleFlight("style_images")
+
+# Generations block their thread for seconds; a dedicated pool keeps them from
+# starving the default executor (disk cache reads, image preprocessing, catalog
+# rebuilds), and further generations queue here
+STYLE_IMAGE_WORKERS = int(os.getenv("STYLE_IMAGE_WORKERS", "4"))
+image_executor = ThreadPoolExecutor(max_workers=STYLE_IMAGE_WORKERS, thread_name_prefix="style-image")
 
-async def generate_style_image(recommendations: Dict) -> bytes:
+# When the disk cache is next pruned (on the first write after startup)
+_next_disk_prune = 0.0
+
+def build_style_prompt(recommendations: Dict) -> str:
     """
-    Generate an image based on fashion recommendations.
-    
-    Args:
-        recommendations: Dictionary containing style and items recommendations
-        
-    Returns:
-        bytes: Generated image in bytes format
+    Flatten the recommendations into a text-to-image prompt.
     """
-    # Flatten the recommendations into a prompt
     style = recommendations["style"]
     items = recommendations["items"]
-    
+
     prompt = f"A fashion outfit in {style['title']} style. {style['description']}. "
     prompt += "The outfit includes: "
     prompt += ", ".join([item["description"] for item in items])
     prompt += f". Style tags: {', '.join(style['tags'])}."
-    
-    # Generate the image
-    print(f"Generating image with prompt: {prompt}")
-    image = client.text_to_image(
-        prompt,
-        model="black-forest-labs/FLUX.1-dev",
-    )
-    print("Image generated successfully")
-    
-    # Convert PIL image to bytes
-    img_byte_arr = BytesIO()
-    image.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)  # Move to the beginning of BytesIO object
-    print(f"Image converted to bytes, size: {len(img_byte_arr.getvalue())} bytes")
-    
-    # Save a copy to disk for debugging
-    output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp', 'generated_images')
-    os.makedirs(output_dir, exist_ok=True)
-    image_path = os.path.join(output_dir, f'style_image_{int(time.time())}.png')
-    image.save(image_path)
-    print(f"Debug image saved to: {image_path}")
-    
-    return img_byte_arr.getvalue()
\ No newline at end of file
+    return prompt
+
+def style_image_hash(recommendations: Dict) -> str:
+    """
+    Content key for the image generated from these recommendations. Known before
+    generation starts, so it can be handed to clients right away.
+    """
+    prompt = " ".join(build_style_prompt(recommendations).split())
+    return hashlib.sha256(f"{STYLE_IMAGE_MODEL}|{STYLE_IMAGE_FORMAT}|{prompt}".encode("utf-8")).hexdigest()
+
+def _disk_path(image_hash: str) -> str:
+    return os.path.join(STYLE_IMAGE_CACHE_DIR, f"{image_hash}.{STYLE_IMAGE_FORMAT.lower()}")
+
+def _read_disk_image(image_hash: str) -> Optional[bytes]:
+    if not STYLE_IMAGE_CACHE_DIR:
+        return None
+    path = _disk_path(image_hash)
+    try:
+        if time.time() - os.path.getmtime(path) > STYLE_IMAGE_CACHE_TTL:
+            return None
+        with open(path, "rb") as image_file:
+            return image_file.read()
+    except OSError:
+        return None
+
+def _write_disk_image(image_hash: str, image_bytes: bytes) -> None:
+    if not STYLE_IMAGE_CACHE_DIR:
+        return
+    os.makedirs(STYLE_IMAGE_CACHE_DIR, exist_ok=True)
+    path = _disk_path(image_hash)
+    # Write then rename so readers never see a partial file
+    with open(path + ".tmp", "wb") as image_file:
+        image_file.write(image_bytes)
+    os.replace(path + ".tmp", path)
+
+    global _next_disk_prune
+    if time.monotonic() >= _next_disk_prune:
+        _next_disk_prune = time.monotonic() + STYLE_IMAGE_CACHE_PRUNE_INTERVAL
+        prune_disk_images()
+
+def prune_disk_images() -> int:
+    """
+    Delete cached image files that have expired, then the oldest ones until
+    the directory is within STYLE_IMAGE_CACHE_DIR_MAX_BYTES.
+
+    Returns:
+        int: Number of files deleted
+    """
+    try:
+        with os.scandir(STYLE_IMAGE_CACHE_DIR) as entries:
+            files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries if entry.is_file()]
+    except OSError as e:
+        logger.warning("Could not list the style image cache: %s", e)
+        return 0
+
+    files.sort()
+    expired_before = time.time() - STYLE_IMAGE_CACHE_TTL
+    total_bytes = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if mtime > expired_before and total_bytes <= STYLE_IMAGE_CACHE_DIR_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+    if removed:
+        logger.info("Pruned %d files from the style image cache (%d bytes left)", removed, total_bytes)
+    return removed
+
+async def get_cached_style_image(image_hash: str) -> Optional[bytes]:
+    """
+    Look up a generated image by hash in memory, then on disk.
+    """
+    image_bytes = style_image_cache.get(image_hash)
+    if image_bytes is None and STYLE_IMAGE_CACHE_DIR:
+        image_bytes = await asyncio.to_thread(_read_disk_image, image_hash)
+        if image_bytes is not None:
+            style_image_cache.set(image_hash, image_bytes)
+    return image_bytes
+
+async def get_style_image(image_hash: str) -> Optional[bytes]:
+    """
+    Return a generated image by hash, waiting for it if generation is still running.
+
+    Returns:
+        bytes: Encoded image, or None if the hash is unknown or expired
+    """
+    image_bytes = await get_cached_style_image(image_hash)
+    if image_bytes is not None:
+        return image_bytes
+    pending = image_flight.get(image_hash)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    return None
+
+async def generate_style_image(recommendations: Dict) -> str:
+    """
+    Generate an image based on fashion recommendations, reusing a cached image
+    when the same style was generated before.
+
+    Args:
+        recommendations: Dictionary containing style and items recommendations
+
+    Returns:
+        str: Hash of the generated image, served by GET /api/images/{hash}
+    """
+    prompt = build_style_prompt(recommendations)
+    image_hash = style_image_hash(recommendations)
+
+    if await get_cached_style_image(image_hash) is not None:
+        logger.debug("Style image cache hit: %s", image_hash[:12])
+        return image_hash
+
+    # Generate the image on the image pool; the inference client is synchronous
+    # and would otherwise block the event loop for the whole generation
+    logger.info("Generating style image %s", image_hash[:12])
+    logger.debug("Style image prompt: %s", prompt)
+    await image_flight.do(image_hash, lambda: _generate_and_store(image_hash, prompt))
+    return image_hash
+
+async def _generate_and_store(image_hash: str, prompt: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    image_bytes = await loop.run_in_executor(image_executor, _generate_image_bytes, prompt)
+    style_image_cache.set(image_hash, image_bytes)
+    if STYLE_IMAGE_CACHE_DIR:
+        await asyncio.to_thread(_write_disk_image, image_hash, image_bytes)
+    return image_bytes
+
+def encode_style_image(image: Image.Image) -> bytes:
+    """
+    Encode a generated image compactly, lowering quality until it fits the size target.
+
+    Args:
+        image: Generated PIL image
+
+    Returns:
+        bytes: Encoded image in STYLE_IMAGE_FORMAT
+    """
+    if max(image.size) > STYLE_IMAGE_MAX_DIMENSION:
+        image = image.copy()
+        image.thumbnail((STYLE_IMAGE_MAX_DIMENSION, STYLE_IMAGE_MAX_DIMENSION), Image.LANCZOS)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    quality = STYLE_IMAGE_QUALITY
+    while True:
+        buffer = BytesIO()
+        image.save(buffer, format=STYLE_IMAGE_FORMAT, quality=quality)
+        if buffer.tell() <= STYLE_IMAGE_TARGET_BYTES or quality <= STYLE_IMAGE_MIN_QUALITY:
+            return buffer.getvalue()
+        quality = max(STYLE_IMAGE_MIN_QUALITY, quality - 10)
+
+def _generate_image_bytes(prompt: str) -> bytes:
+    """
+    Run the blocking FLUX generation and encoding.
+
+    Args:
+        prompt: Text prompt for the image
+
+    Returns:
+        bytes: Generated image in STYLE_IMAGE_FORMAT
+    """
+    with track_stage("image_generation"):
+        try:
+            image = clients.get("huggingface").text_to_image(
+                prompt,
+                model=STYLE_IMAGE_MODEL,
+            )
+        except Exception:
+            UPSTREAM_REQUESTS.inc(service="huggingface", outcome="error")
+            raise
+    UPSTREAM_REQUESTS.inc(service="huggingface", outcome="ok")
+
+    with track_stage("image_encoding"):
+        image_bytes = encode_style_image(image)
+    PAYLOAD_BYTES.observe(len(image_bytes), kind="style_image")
+    logger.info("Style image encoded as %s, size: %d bytes", STYLE_IMAGE_FORMAT, len(image_bytes))
+
+    # Optionally save a full-quality copy to disk for debugging
+    if SAVE_DEBUG_IMAGES:
+        output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'temp', 'generated_images')
+        os.makedirs(output_dir, exist_ok=True)
+        image_path = os.path.join(output_dir, f'style_image_{int(time.time())}.png')
+        image.save(image_path)
+        logger.debug("Debug image saved to: %s", image_path)
+
+    return image_bytes
@@ -1,20 +1,50 @@
 import os
-import base64
-from typing import Dict, List
-from openai import AsyncOpenAI
-import dotenv
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
 import json
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from app.services.client_registry import clients, require_env
+from app.utils.cache import TTLCache, make_content_key
+from app.utils.image_utils import PreparedImage, prepare_images_for_vision
+from app.utils.json_stream import JsonArrayStream
+from app.utils.metrics import OPENAI_TOKENS, STAGE_DURATION, UPSTREAM_REQUESTS, record_fallback, track_stage
 
-# Load environment variables explicitly
-dotenv.load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
-    
-client = AsyncOpenAI(api_key=api_key)
+def _create_openai_client():
+    # Imported here: the SDK is the slowest import in the app (OPENAI_BASE_URL is honored by the SDK)
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=require_env("OPENAI_API_KEY"))
+
+clients.register("openai", _create_openai_client)
+
+# How the profile photo is analyzed:
+# - "sequential": separate attribute analysis call, then the recommendation call (two vision calls in a row)
+# - "concurrent": attribute analysis runs in the background and is cached per image hash; the
+#   recommendation call uses cached attributes when available and never waits for the analysis
+# - "single_pass": attributes are extracted inside the structured recommendation call itself
+VISION_ANALYSIS_MODES = ("sequential", "concurrent", "single_pass")
+VISION_ANALYSIS_MODE = os.getenv("VISION_ANALYSIS_MODE", "sequential").lower()
+if VISION_ANALYSIS_MODE not in VISION_ANALYSIS_MODES:
+    logger.warning("Unknown VISION_ANALYSIS_MODE '%s', falling back to 'sequential'", VISION_ANALYSIS_MODE)
+    VISION_ANALYSIS_MODE = "sequential"
+
+# User attributes extracted from profile photos, keyed by image content hash
+USER_ATTRIBUTES_CACHE_MAX_ENTRIES = int(os.getenv("USER_ATTRIBUTES_CACHE_MAX_ENTRIES", "1024"))
+USER_ATTRIBUTES_CACHE_TTL = float(os.getenv("USER_ATTRIBUTES_CACHE_TTL", "604800"))
+USER_ATTRIBUTES_CACHE_DB = os.getenv("USER_ATTRIBUTES_CACHE_DB", "")
+
+user_attributes_cache = TTLCache(
+    "user_attributes",
+    max_entries=USER_ATTRIBUTES_CACHE_MAX_ENTRIES,
+    ttl=USER_ATTRIBUTES_CACHE_TTL,
+    db_path=USER_ATTRIBUTES_CACHE_DB or None
+)
+
+# Keep references to background analysis tasks so they aren't garbage collected
+_background_tasks = set()
 
 # Define clothing categories for diverse recommendations
 CLOTHING_CATEGORIES = [
@@ -40,19 +70,60 @@ class StyleResponse(BaseModel):
     style: Style
     items: List[Item]
 
-async def analyze_user_photos(user_photo_paths: List[str]) -> Dict:
+class UserAttributes(BaseModel):
+    gender_presentation: str
+    apparent_age_range: str
+    body_type: str
+    height_impression: str
+    skin_tone: str
+    style_suggestions: List[str]
+    colors_to_complement: List[str]
+    avoid_styles: List[str]
+
+class SinglePassStyleResponse(StyleResponse):
+    user_attributes: UserAttributes
+
+def log_openai_usage(label: str, model: str, started: float, response) -> None:
+    """
+    Log latency and token usage for an OpenAI call and count it in the metrics.
+    """
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    UPSTREAM_REQUESTS.inc(service="openai", outcome="ok")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        OPENAI_TOKENS.inc(usage.prompt_tokens, model=model, kind="prompt")
+        OPENAI_TOKENS.inc(usage.completion_tokens, model=model, kind="completion")
+        logger.info(
+            "OpenAI %s (%s): %.0f ms, prompt_tokens=%d, completion_tokens=%d, total_tokens=%d",
+            label, model, elapsed_ms, usage.prompt_tokens, usage.completion_tokens, usage.total_tokens
+        )
+    else:
+        logger.info("OpenAI %s (%s): %.0f ms", label, model, elapsed_ms)
+
+async def analyze_user_photos(user_photos: List[bytes], prepared_photos: Optional[List[PreparedImage]] = None) -> Dict:
     """
     Analyze user photos to extract physical attributes for personalized fashion recommendations.
     
     Args:
-        user_photo_paths: List of paths to user photos
+        user_photos: Raw image bytes of the user photos
+        prepared_photos: Already preprocessed payloads for the same photos, if the caller has them
     
     Returns:
         Dict: Dictionary containing extracted attributes (gender, age_range, body_type, skin_tone, etc.)
     """
-    if not user_photo_paths:
+    if not user_photos:
         return {}
     
+    # Identical photos always produce the same analysis; skip the model for repeats
+    cache_key = make_content_key(user_photos)
+    cached_attributes = await user_attributes_cache.aget(cache_key)
+    if cached_attributes is not None:
+        logger.debug("Using cached attributes for photos %s", cache_key[:12])
+        return cached_attributes
+    
+    if prepared_photos is None:
+        prepared_photos = await prepare_images_for_vision(user_photos)
+    
     # Prepare messages for the API call
     messages = [
         {
@@ -73,14 +144,11 @@ async def analyze_user_photos(user_photo_paths: List[str]) -> Dict:
     ]
     
     # Add user photos
-    for photo_path in user_photo_paths:
-        with open(photo_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
+    for photo in prepared_photos:
         messages.append({
             "role": "user",
             "content": [
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                {"type": "image_url", "image_url": {"url": photo.data_url}}
             ]
         })
     
@@ -91,41 +159,87 @@ async def analyze_user_photos(user_photo_paths: List[str]) -> Dict:
     })
     
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=800,
-            temperature=0.5
-        )
+        started = time.perf_counter()
+        with track_stage("vision_analysis"):
+            response = await clients.get("openai").beta.chat.completions.parse(
+                model="gpt-4o",
+                messages=messages,
+                max_tokens=800,
+                temperature=0.5,
+                response_format=UserAttributes
+            )
+        log_openai_usage("photo analysis", "gpt-4o", started, response)
         
-        response_text = response.choices[0].message.content.strip()
-        
-        # Try to extract JSON from the response
-        try:
-            # Find JSON object in the response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx]
-                attributes = json.loads(json_str)
-                print(f"Successfully extracted user attributes: {list(attributes.keys())}")
-                return attributes
-            else:
-                print("Could not find JSON in user photo analysis response")
-                return {}
-                
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON from user photo analysis: {str(e)}")
-            print(f"Response text: {response_text[:200]}...")
+        # Already validated against UserAttributes by the SDK; refusals leave it empty
+        message = response.choices[0].message
+        if message.parsed is None:
+            logger.warning("No attributes in user photo analysis response: %.200s", message.refusal or message.content)
+            record_fallback("empty_user_attributes")
             return {}
+        
+        attributes = message.parsed.model_dump()
+        logger.debug("Extracted user attributes: %s", list(attributes.keys()))
+        user_attributes_cache.set(cache_key, attributes)
+        return attributes
             
     except Exception as e:
-        print(f"Error analyzing user photos: {str(e)}")
+        logger.error("Error analyzing user photos: %s", e)
+        UPSTREAM_REQUESTS.inc(service="openai", outcome="error")
+        record_fallback("empty_user_attributes")
         return {}
 
+def default_recommendations(additional_info: str, budget: str) -> Dict:
+    """
+    Generic recommendations used when the model call fails or refuses.
+    """
+    return {
+        "style": {
+            "title": "Casual",
+            "description": "Casual style",
+            "tags": ["casual", "comfortable", "everyday"]
+        },
+        "items": [
+            {
+                "description": f"Fashion item matching {additional_info}",
+                "category": "Tops"
+            },
+            {
+                "description": f"Fashion item for {budget} budget",
+                "category": "Bottoms"
+            }
+        ]
+    }
 
-async def generate_search_query(user_input: Dict) -> Dict:
+async def stream_structured_completion(request: Dict, on_item: Callable[[Dict], None]):
+    """
+    Run a structured-output completion as a stream, calling on_item with each
+    validated Item as soon as its JSON object closes in the generated text.
+
+    Args:
+        request: Keyword arguments for the completion, including response_format
+        on_item: Called with each item dict ({"description", "category"}) in order
+
+    Returns:
+        The final parsed completion, the same as beta.chat.completions.parse returns
+    """
+    items = JsonArrayStream("items")
+    async with clients.get("openai").beta.chat.completions.stream(
+        **request,
+        stream_options={"include_usage": True}
+    ) as stream:
+        async for event in stream:
+            if event.type != "content.delta":
+                continue
+            for element in items.feed(event.delta):
+                try:
+                    item = Item.model_validate(element)
+                except ValidationError as e:
+                    logger.debug("Skipping malformed streamed item: %s", e)
+                    continue
+                on_item(item.model_dump())
+        return await stream.get_final_completion()
+
+async def generate_search_query(user_input: Dict, on_item: Optional[Callable[[Dict], None]] = None) -> Dict:
     """
     Generate fashion recommendations using OpenAI's API.
     
@@ -133,8 +247,10 @@ async def generate_search_query(user_input: Dict) -> Dict:
         user_input: Dictionary containing:
             - additional_info: String with style preferences
             - budget: Price range (low/medium/high)
-            - profile_photo_path: Path to user's profile photo
-            - aesthetic_photo_paths: List of paths to inspiration/aesthetic photos
+            - profile_photo: Raw bytes of the user's profile photo (optional)
+            - aesthetic_photos: List of raw inspiration/aesthetic photo bytes
+        on_item: If given, the completion is streamed and this is called with each
+            item as soon as it has been generated, before the full response is returned
     
     Returns:
         Dict: Fashion recommendations in the format:
@@ -156,14 +272,35 @@ async def generate_search_query(user_input: Dict) -> Dict:
     # Extract user inputs
     additional_info = user_input.get("additional_info", "")
     budget = user_input.get("budget", "medium")
-    profile_photo_path = user_input.get("profile_photo_path")
-    aesthetic_photo_paths = user_input.get("aesthetic_photo_paths", [])
+    profile_photo = user_input.get("profile_photo")
+    aesthetic_photos = user_input.get("aesthetic_photos", [])
+    
+    mode = VISION_ANALYSIS_MODE
+    pipeline_started = time.perf_counter()
+    
+    # Preprocess every photo once; the encoded payloads are reused for each model call
+    prepared_photos = await prepare_images_for_vision(([profile_photo] if profile_photo else []) + aesthetic_photos)
+    prepared_profile_photo = prepared_photos[0] if profile_photo else None
+    prepared_aesthetic_photos = prepared_photos[1:] if profile_photo else prepared_photos
     
     # First, analyze user photo if provided
     user_attributes = {}
-    if profile_photo_path:
-        print("Analyzing profile photo...")
-        user_attributes = await analyze_user_photos([profile_photo_path])
+    photo_hash = None
+    if profile_photo:
+        if mode == "sequential":
+            logger.debug("Analyzing profile photo")
+            user_attributes = await analyze_user_photos([profile_photo], [prepared_profile_photo])
+        else:
+            photo_hash = make_content_key([profile_photo])
+            user_attributes = await user_attributes_cache.aget(photo_hash) or {}
+            if user_attributes:
+                logger.debug("Using cached attributes for profile photo %s", photo_hash[:12])
+            elif mode == "concurrent":
+                # Analyze in the background for next time; don't hold up this request
+                logger.debug("Analyzing profile photo in the background")
+                task = asyncio.create_task(analyze_user_photos([profile_photo], [prepared_profile_photo]))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
     
     # Prepare the prompt for OpenAI
     prompt = """As a fashion expert, analyze the provided information and generate fashion recommendations.
@@ -203,8 +340,17 @@ User preferences:
     if user_attributes:
         prompt += f"User attributes: {json.dumps(user_attributes, indent=2)}\n"
     
-    if aesthetic_photo_paths:
-        prompt += f"Number of inspiration photos provided: {len(aesthetic_photo_paths)}\n"
+    if aesthetic_photos:
+        prompt += f"Number of inspiration photos provided: {len(aesthetic_photos)}\n"
+    
+    # In single-pass mode the attribute extraction happens in this call
+    extract_attributes = mode == "single_pass" and profile_photo is not None and not user_attributes
+    if extract_attributes:
+        prompt += """
+Also fill in "user_attributes" from the photo of the person: gender_presentation, apparent_age_range,
+body_type, height_impression, skin_tone, style_suggestions (3-5), colors_to_complement (3-5) and
+avoid_styles (1-2). Be respectful and inclusive, and use these attributes to tailor the recommendations.
+"""
     
     # Prepare the messages for the API call
     messages = [
@@ -213,38 +359,32 @@ User preferences:
     ]
     
     # Add user photo if provided
-    if profile_photo_path:
+    if profile_photo:
         messages.append({
             "role": "user",
             "content": "I'm providing a photo of myself. Please analyze my body type, proportions, and overall appearance to recommend clothing that would be flattering for my physique."
         })
         
-        with open(profile_photo_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
         messages.append({
             "role": "user",
             "content": [
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                {"type": "image_url", "image_url": {"url": prepared_profile_photo.data_url}}
             ]
         })
     
     # Add aesthetic photos if provided
-    if aesthetic_photo_paths and len(aesthetic_photo_paths) > 0:
+    if aesthetic_photos and len(aesthetic_photos) > 0:
         messages.append({
             "role": "user",
-            "content": f"I'm also providing {len(aesthetic_photo_paths)} photo(s) of fashion styles I like. Please analyze these images carefully and consider their colors, patterns, textures, silhouettes, and overall aesthetic when generating your search queries."
+            "content": f"I'm also providing {len(aesthetic_photos)} photo(s) of fashion styles I like. Please analyze these images carefully and consider their colors, patterns, textures, silhouettes, and overall aesthetic when generating your search queries."
         })
         
         # Add each aesthetic photo as a separate message
-        for photo_path in aesthetic_photo_paths:
-            with open(photo_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-                
+        for photo in prepared_aesthetic_photos:
             messages.append({
                 "role": "user",
                 "content": [
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    {"type": "image_url", "image_url": {"url": photo.data_url}}
                 ]
             })
     
@@ -252,93 +392,43 @@ User preferences:
     try:
         # Use gpt-4o for vision capabilities when images are provided
         # Use gpt-4o-mini when no images are provided (more cost-effective)
-        has_images = (profile_photo_path is not None) or (len(aesthetic_photo_paths) > 0)
+        has_images = (profile_photo is not None) or (len(aesthetic_photos) > 0)
         model = "gpt-4o" if has_images else "gpt-4o-mini"
+        request = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": 1200 if extract_attributes else 800,
+            "temperature": 0.7,
+            "response_format": SinglePassStyleResponse if extract_attributes else StyleResponse
+        }
         
-        response = await client.beta.chat.completions.parse(
-            model=model,
-            messages=messages,
-            max_tokens=800,
-            temperature=0.7,
-            response_format=StyleResponse
-        )
+        started = time.perf_counter()
+        with track_stage("style_generation"):
+            if on_item is None:
+                response = await clients.get("openai").beta.chat.completions.parse(**request)
+            else:
+                response = await stream_structured_completion(request, on_item)
+        log_openai_usage(f"recommendations [{mode}]", model, started, response)
+        pipeline_seconds = time.perf_counter() - pipeline_started
+        STAGE_DURATION.observe(pipeline_seconds, stage=f"recommendation_pipeline_{mode}")
+        logger.info("Recommendation pipeline [%s] finished in %.0f ms", mode, pipeline_seconds * 1000)
         
-        # Extract the generated search queries
-        response_text = response.choices[0].message.content.strip()
+        # Already validated against the response model by the SDK; refusals leave it empty
+        message = response.choices[0].message
+        if message.parsed is None:
+            logger.warning("No recommendations in response: %.200s", message.refusal or message.content)
+            record_fallback("default_recommendations")
+            return default_recommendations(additional_info, budget)
         
-        # Try to parse the JSON response
-        try:
-            # Find JSON object in the response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx]
-                recommendations = json.loads(json_str)
-                
-                # Validate the structure
-                if "style" in recommendations and "items" in recommendations:
-                    if "title" in recommendations["style"] and "description" in recommendations["style"] and "tags" in recommendations["style"]:
-                        return recommendations
-                    else:
-                        print("Invalid style format in response, here's the response: ", json_str)
-                
-            # If we get here, the response wasn't in the correct format
-            return {
-                "style": {
-                    "title": "Casual",
-                    "description": "Casual style",
-                    "tags": ["casual", "comfortable", "everyday"]
-                },
-                "items": [
-                    {
-                        "description": f"Fashion item matching {additional_info}",
-                        "category": "Tops"
-                    },
-                    {
-                        "description": f"Fashion item for {budget} budget",
-                        "category": "Bottoms"
-                    }
-                ]
-            }
-                
-        except json.JSONDecodeError:
-            # Fallback if JSON parsing fails
-            return {
-                "style": {
-                    "title": "Casual",
-                    "description": "Casual style",
-                    "tags": ["casual", "comfortable", "everyday"]
-                },
-                "items": [
-                    {
-                        "description": f"Fashion item matching {additional_info}",
-                        "category": "Tops"
-                    },
-                    {
-                        "description": f"Fashion item for {budget} budget",
-                        "category": "Bottoms"
-                    }
-                ]
-            }
+        # Keep attributes from a single-pass call for later requests with the same photo
+        if isinstance(message.parsed, SinglePassStyleResponse) and photo_hash:
+            user_attributes_cache.set(photo_hash, message.parsed.user_attributes.model_dump())
+        
+        return message.parsed.model_dump(exclude={"user_attributes"})
 
     except Exception as e:
-        print(f"Error calling OpenAI API: {str(e)}")
+        logger.error("Error calling OpenAI API: %s", e)
+        UPSTREAM_REQUESTS.inc(service="openai", outcome="error")
+        record_fallback("default_recommendations")
         # Fallback to a basic response
-        return {
-            "style": {
-                "title": "Casual",
-                "description": "Casual style",
-                "tags": ["casual", "comfortable", "everyday"]
-            },
-            "items": [
-                {
-                    "description": f"Fashion item matching {additional_info}",
-                    "category": "Tops"
-                },
-                {
-                    "description": f"Fashion item for {budget} budget",
-                    "category": "Bottoms"
-                }
-            ]
-        }
+        return default_recommendations(additional_info, budget)
@@ -0,0 +1,173 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+# Request priorities; lower numbers are dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKFILL = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_DEFAULT: "default",
+    PRIORITY_BACKFILL: "backfill"
+}
+
+# SerpAPI quota settings (rate in requests per second; 0 disables the rate limit)
+SERPAPI_RATE_LIMIT = float(os.getenv("SERPAPI_RATE_LIMIT", "5"))
+SERPAPI_BURST = int(os.getenv("SERPAPI_BURST", "10"))
+SERPAPI_MAX_IN_FLIGHT = int(os.getenv("SERPAPI_MAX_IN_FLIGHT", "10"))
+
+class OutboundScheduler:
+    """
+    Process-wide gate for calls to a rate-limited upstream API.
+
+    Combines a token bucket (sustained rate plus burst), a cap on concurrent
+    in-flight requests and a priority queue, so interactive requests jump
+    ahead of background work when the quota is saturated.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_in_flight: int):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slot_freed: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.granted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.total_wait_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def _bind_loop(self) -> None:
+        # Futures and events belong to one event loop; start fresh if a new loop is running
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slot_freed = asyncio.Event()
+            self._waiters = []
+            self._dispatcher = None
+            self._in_flight = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _seconds_until_token(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def _take(self, priority: int) -> None:
+        if self.rate > 0:
+            self._tokens -= 1
+        self._in_flight += 1
+        self.granted[priority] = self.granted.get(priority, 0) + 1
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> None:
+        """
+        Wait until a request of the given priority may be sent.
+        Every successful acquire must be paired with release().
+        """
+        self._bind_loop()
+        started = time.monotonic()
+
+        # Fast path: nothing queued and capacity available
+        if not self._waiters and self._in_flight < self.max_in_flight and self._seconds_until_token() == 0:
+            self._take(priority)
+            return
+
+        future = self._loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = self._loop.create_task(self._dispatch())
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been granted just before cancellation; give it back
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        self.total_wait_seconds += time.monotonic() - started
+
+    def release(self) -> None:
+        """
+        Return an in-flight slot.
+        """
+        self._in_flight = max(0, self._in_flight - 1)
+        if self._slot_freed is not None:
+            self._slot_freed.set()
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            if self._in_flight >= self.max_in_flight:
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+                continue
+
+            wait = self._seconds_until_token()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # Caller was cancelled while queued
+                continue
+            self._take(priority)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_DEFAULT):
+        """
+        Hold an outbound request slot for the duration of the block.
+        """
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return queue depth and dispatch counters for monitoring.
+        """
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        total_granted = sum(self.granted.values())
+        return {
+            "name": self.name,
+            "rate_limit_per_second": self.rate,
+            "burst": self.burst,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "queue_depth": sum(queued.values()),
+            "queued_by_priority": queued,
+            "max_queue_depth": self.max_queue_depth,
+            "granted_by_priority": {PRIORITY_NAMES.get(priority, str(priority)): count for priority, count in self.granted.items()},
+            "average_wait_ms": round(self.total_wait_seconds / total_granted * 1000, 2) if total_granted else 0.0
+        }
+
+serpapi_scheduler = OutboundScheduler(
+    "serpapi",
+    rate=SERPAPI_RATE_LIMIT,
+    burst=SERPAPI_BURST,
+    max_in_flight=SERPAPI_MAX_IN_FLIGHT
+)
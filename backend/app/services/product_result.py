@@ -0,0 +1,132 @@
+from typing import Any, Dict, Optional, Sequence
+
+# Search pages for stores whose shopping results sometimes come without a product link
+_STORE_SEARCH_URLS = (
+    ("amazon", "https://www.amazon.com/s?k={}"),
+    ("ebay", "https://www.ebay.com/sch/i.html?_nkw={}"),
+    ("etsy", "https://www.etsy.com/search?q={}"),
+    ("walmart", "https://www.walmart.com/search?q={}"),
+    ("target", "https://www.target.com/s?searchTerm={}")
+)
+
+class ProductResult:
+    """
+    One normalized shopping result.
+
+    A __slots__ class rather than a dict per result: a fraction of the memory
+    for the shopping cache and the catalog, which hold thousands of these.
+    Instances in the shopping cache are shared between requests, so per-query
+    fields are set on a copy (see with_query).
+    """
+    __slots__ = ("title", "link", "source", "price", "thumbnail", "rating", "reviews", "extensions", "search_query", "category")
+
+    def __init__(
+        self,
+        title: str,
+        link: str,
+        source: str = "",
+        price: str = "",
+        thumbnail: str = "",
+        rating: Optional[float] = None,
+        reviews: Optional[int] = None,
+        extensions: Sequence[str] = (),
+        search_query: str = "",
+        category: str = ""
+    ):
+        self.title = title
+        self.link = link
+        self.source = source
+        self.price = price
+        self.thumbnail = thumbnail
+        self.rating = rating
+        self.reviews = reviews
+        self.extensions = extensions
+        self.search_query = search_query
+        self.category = category
+
+    def __repr__(self) -> str:
+        return f"ProductResult(title={self.title!r}, link={self.link!r}, price={self.price!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, ProductResult):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def with_query(self, search_query: str, category: str = "") -> "ProductResult":
+        """
+        Return a copy tagged with the query (and category) that found it.
+        """
+        return ProductResult(
+            self.title, self.link, self.source, self.price, self.thumbnail,
+            self.rating, self.reviews, self.extensions, search_query, category
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Plain dict of every field, for JSON responses and the persistent cache.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_recommendation(self) -> Dict[str, Any]:
+        """
+        The product format returned to the frontend.
+        """
+        return {
+            "description": self.title,
+            "productURL": self.link,
+            "price": self.price,
+            "thumbnailURL": self.thumbnail,
+            "rating": self.rating,
+        }
+
+def fix_product_link(item: Dict[str, Any]) -> str:
+    """
+    Pick a usable link for a SerpAPI shopping result: "link", then
+    "product_link", then a store search page for the title; scheme added and
+    spaces escaped. Empty if nothing fits.
+    """
+    product_link = item.get("link") or item.get("product_link") or ""
+    if product_link.startswith("https://") and " " not in product_link and not product_link[-1].isspace():
+        # Already clean, as almost every link is
+        return product_link
+    if not product_link:
+        source = (item.get("source") or "").lower()
+        title = item.get("title") or ""
+        if source and title:
+            for store, url in _STORE_SEARCH_URLS:
+                if store in source:
+                    product_link = url.format(title.replace(" ", "+"))
+                    break
+    if not product_link:
+        return ""
+    product_link = product_link.strip()
+    if not product_link.startswith(("http://", "https://")):
+        product_link = "https://" + product_link
+    return product_link.replace(" ", "%20")
+
+def normalize_shopping_result(item: Dict[str, Any]) -> ProductResult:
+    """
+    Build a ProductResult from a raw SerpAPI shopping result (or a dict from to_dict).
+
+    Args:
+        item: One entry of shopping_results
+
+    Returns:
+        ProductResult: The normalized result; link is empty when none could be found
+    """
+    get = item.get
+    extensions = get("extensions")
+    # Positional arguments: this runs for every result of every search
+    return ProductResult(
+        get("title") or "",
+        fix_product_link(item),
+        get("source") or "",
+        get("price") or "",
+        get("thumbnail") or "",
+        get("rating"),
+        get("reviews"),
+        # Tuples are immutable, so shared cached results can't be changed through them
+        tuple(extensions) if extensions else (),
+        get("search_query") or "",
+        get("category") or ""
+    )
@@ -0,0 +1,217 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.services.serpapi_service import CLOTHING_CATEGORIES
+from app.utils.cache import make_cache_key
+
+COLORS = {
+    "black": "black", "white": "white", "ivory": "ivory", "cream": "cream", "off white": "off-white",
+    "beige": "beige", "tan": "tan", "camel": "camel", "brown": "brown", "chocolate": "chocolate",
+    "khaki": "khaki", "olive": "olive", "olive green": "olive", "green": "green", "sage": "sage",
+    "sage green": "sage", "emerald": "emerald", "emerald green": "emerald", "dark green": "dark green",
+    "navy": "navy", "navy blue": "navy", "blue": "blue", "light blue": "light blue", "sky blue": "light blue",
+    "teal": "teal", "turquoise": "turquoise", "red": "red", "burgundy": "burgundy", "maroon": "burgundy",
+    "pink": "pink", "blush": "blush", "blush pink": "blush", "dusty pink": "blush", "purple": "purple", "lavender": "lavender", "lilac": "lilac",
+    "yellow": "yellow", "mustard": "mustard", "orange": "orange", "rust": "rust", "coral": "coral",
+    "grey": "grey", "gray": "grey", "light grey": "light grey", "light gray": "light grey", "charcoal": "charcoal", "silver": "silver", "gold": "gold"
+}
+
+MATERIALS = {
+    "cotton": "cotton", "linen": "linen", "wool": "wool", "merino": "merino", "cashmere": "cashmere",
+    "silk": "silk", "satin": "satin", "denim": "denim", "leather": "leather", "faux leather": "faux leather",
+    "vegan leather": "faux leather", "suede": "suede", "velvet": "velvet", "corduroy": "corduroy",
+    "tweed": "tweed", "chiffon": "chiffon", "lace": "lace", "knit": "knit", "cable knit": "cable-knit",
+    "ribbed": "ribbed", "fleece": "fleece", "nylon": "nylon", "polyester": "polyester", "canvas": "canvas",
+    "mesh": "mesh", "sequin": "sequin", "sequined": "sequin", "crochet": "crochet", "twill": "twill",
+    "flannel": "flannel", "poplin": "poplin", "chambray": "chambray", "shearling": "shearling"
+}
+
+FITS = {
+    "oversized": "oversized", "slim": "slim", "slim fit": "slim", "skinny": "skinny", "relaxed": "relaxed",
+    "relaxed fit": "relaxed", "loose": "relaxed", "fitted": "fitted", "tailored": "tailored",
+    "cropped": "cropped", "boxy": "boxy", "straight leg": "straight-leg", "wide leg": "wide-leg",
+    "high waisted": "high-waisted", "high waist": "high-waisted", "high rise": "high-waisted",
+    "low rise": "low-rise", "a line": "a-line", "bootcut": "bootcut", "flared": "flared", "flare": "flared",
+    "longline": "longline", "maxi": "maxi", "midi": "midi", "mini": "mini"
+}
+
+PATTERNS = {
+    "floral": "floral", "floral print": "floral", "flowered": "floral", "striped": "striped", "stripe": "striped",
+    "stripes": "striped", "pinstripe": "pinstripe", "pinstriped": "pinstripe", "plaid": "plaid", "tartan": "plaid",
+    "check": "check", "checked": "check", "gingham": "gingham", "houndstooth": "houndstooth", "polka dot": "polka-dot",
+    "polka dots": "polka-dot", "leopard": "leopard", "leopard print": "leopard", "animal print": "animal print",
+    "zebra": "zebra", "snakeskin": "snakeskin", "paisley": "paisley", "camo": "camo", "camouflage": "camo",
+    "tie dye": "tie-dye", "tie dyed": "tie-dye", "geometric": "geometric", "color block": "color-block",
+    "colorblock": "color-block", "graphic": "graphic", "embroidered": "embroidered"
+}
+
+# Length words are listed as dresses in CLOTHING_CATEGORIES but usually modify another garment
+_LENGTH_WORDS = {"maxi", "midi", "mini"}
+# Plural-only garments whose singular is a modifier ("short sleeve", "flat sandals", "low heel")
+_PLURAL_ONLY = {"shorts", "flats", "heels", "pants", "pumps", "slacks", "oxfords"}
+
+# At most this many terms per attribute, so long descriptions still yield short queries
+MAX_TERMS_PER_ATTRIBUTE = 2
+# Unclassified words (brands, models, styles) kept right before the garment
+MAX_DETAIL_WORDS = 4
+# Words kept from the description when nothing in the vocabulary matched
+FALLBACK_QUERY_WORDS = 6
+
+# Commas are tokens too: they end the phrase naming the item
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[,;]")
+_FALLBACK_STOPWORDS = {"a", "an", "and", "the", "for", "with", "in", "of", "by", "to", "on", "or", "that", "this", "is", "it", "perfect", ",", ";"}
+# Once the item has been named, these start a clause about something else
+# ("bag with gold hardware", "boots, perfect for fall")
+_CLAUSE_BREAKS = {",", ";", "with", "featuring", "and", "paired", "for", "that", "which", "to", "perfect", "ideal", "great"}
+# Praise the style model adds that says nothing about the product
+_FILLER_WORDS = {
+    "stylish", "classic", "timeless", "effortless", "chic", "elegant", "sophisticated", "versatile", "comfortable",
+    "comfy", "cozy", "cosy", "trendy", "modern", "simple", "basic", "sleek", "beautiful", "cute", "flattering",
+    "statement", "everyday", "essential", "staple", "polished", "lightweight", "flowy", "flowing", "soft", "pair",
+    "piece", "style", "styled", "look", "nice", "quality", "luxurious", "luxe", "minimalist", "minimal", "refined", "crisp"
+}
+
+def _garment_forms(keyword: str) -> List[str]:
+    # Descriptions say "sneaker" as often as "sneakers" and "dresses" as often as "dress"
+    forms = [keyword, keyword + "s", keyword + "es"]
+    if keyword.endswith("s") and not keyword.endswith("ss") and keyword not in _PLURAL_ONLY:
+        forms.append(keyword[:-1])
+    return forms
+
+def _build_phrases() -> Dict[Tuple[str, ...], Tuple[str, str]]:
+    phrases: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+    for category, keywords in CLOTHING_CATEGORIES.items():
+        for keyword in keywords:
+            if keyword in _LENGTH_WORDS:
+                continue
+            for form in _garment_forms(keyword):
+                phrases.setdefault(tuple(_TOKEN_RE.findall(form)), ("garment", keyword))
+    for kind, vocabulary in (("color", COLORS), ("material", MATERIALS), ("fit", FITS), ("pattern", PATTERNS)):
+        for phrase, canonical in vocabulary.items():
+            phrases[tuple(phrase.split())] = (kind, canonical)
+    return phrases
+
+_PHRASES = _build_phrases()
+_MAX_PHRASE_WORDS = max(len(phrase) for phrase in _PHRASES)
+_GARMENT_CATEGORIES = {keyword: category for category, keywords in CLOTHING_CATEGORIES.items() for keyword in keywords}
+
+@dataclass(frozen=True)
+class CanonicalQuery:
+    """
+    Short, normalized shopping query extracted from a free-text item description.
+    """
+    text: str
+    key: str
+    garment: Optional[str]
+    category: Optional[str]
+    colors: Tuple[str, ...]
+    materials: Tuple[str, ...]
+    fit: Tuple[str, ...]
+    patterns: Tuple[str, ...] = ()
+    details: Tuple[str, ...] = ()
+
+def _scan(tokens: List[str]) -> List[Tuple[int, int, str, str]]:
+    # (position, length, kind, canonical term); longest phrase first at each position
+    matches = []
+    index = 0
+    while index < len(tokens):
+        for length in range(min(_MAX_PHRASE_WORDS, len(tokens) - index), 0, -1):
+            match = _PHRASES.get(tuple(tokens[index:index + length]))
+            if match is not None:
+                matches.append((index, length, match[0], match[1]))
+                index += length
+                break
+        else:
+            index += 1
+    return matches
+
+def _pick(terms: List[str]) -> Tuple[str, ...]:
+    # First mentions win; sorted so reordered adjectives give the same query
+    unique = list(dict.fromkeys(terms))[:MAX_TERMS_PER_ATTRIBUTE]
+    return tuple(sorted(unique))
+
+@lru_cache(maxsize=4096)
+def canonicalize_query(description: str) -> CanonicalQuery:
+    """
+    Reduce an item description to
+    "<fit> <colors> <materials> <patterns> <details> <length> <garment>".
+
+    Only the phrase naming the item is read: it ends at the first clause break
+    ("with", "for", a comma, ...) after a garment. The garment is the head noun,
+    the last CLOTHING_CATEGORIES term in that phrase (joined with an immediately
+    preceding one, e.g. "tank top"); earlier garment words are modifiers
+    ("top-stitched coat"). Words before the garment that aren't in any
+    vocabulary, such as brands and models ("levi 501 jeans"), are kept in order
+    as details. Descriptions without a known garment keep their first few words
+    instead. Meant for generated item descriptions, not for queries users type.
+    Deterministic and model-free, so equal canonical text means an equal cache key.
+
+    Args:
+        description: Free-text item description
+
+    Returns:
+        CanonicalQuery: Canonical query text, its cache key and the extracted attributes
+    """
+    tokens = _TOKEN_RE.findall(description.lower().replace("'", ""))
+    matches = _scan(tokens)
+
+    # Cut the description after the phrase that names the item
+    end = len(tokens)
+    named = False
+    matched_at = {position: kind for position, _, kind, _ in matches}
+    for index, token in enumerate(tokens):
+        if named and token in _CLAUSE_BREAKS:
+            end = index
+            break
+        named = named or matched_at.get(index) == "garment"
+    matches = [match for match in matches if match[0] < end]
+
+    colors = [term for _, _, kind, term in matches if kind == "color"]
+    materials = [term for _, _, kind, term in matches if kind == "material"]
+    fit = [term for _, _, kind, term in matches if kind == "fit"]
+    patterns = [term for _, _, kind, term in matches if kind == "pattern"]
+
+    garment = None
+    details: List[str] = []
+    garments = [(position, length, term) for position, length, kind, term in matches if kind == "garment"]
+    if garments:
+        position, length, garment = garments[-1]
+        head = position
+        if len(garments) > 1 and garments[-2][0] + garments[-2][1] == position:
+            head = garments[-2][0]
+            garment = f"{garments[-2][2]} {garment}"
+        # Everything before the head that no vocabulary claimed, other garment words included
+        claimed = {position + offset for position, length, kind, _ in matches if kind != "garment" for offset in range(length)}
+        details = [
+            token for index, token in enumerate(tokens[:head])
+            if index not in claimed and token not in _FALLBACK_STOPWORDS and token not in _FILLER_WORDS
+        ][-MAX_DETAIL_WORDS:]
+    elif set(fit) & _LENGTH_WORDS:
+        # "a flowing midi" still names a dress
+        garment = "dress"
+
+    # Lengths read best right before the garment ("lavender midi dress")
+    length = _pick([term for term in fit if term in _LENGTH_WORDS])[:1]
+    picked_fit = _pick([term for term in fit if term not in _LENGTH_WORDS])
+    picked_colors, picked_materials, picked_patterns = _pick(colors), _pick(materials), _pick(patterns)
+    if garment is None:
+        # Jewelry, eyewear and the like aren't in the garment vocabulary; keep the leading words instead
+        words = [token for token in tokens if token not in _FALLBACK_STOPWORDS and token not in _FILLER_WORDS][:FALLBACK_QUERY_WORDS]
+        text = " ".join(words)
+    else:
+        text = " ".join([*picked_fit, *picked_colors, *picked_materials, *picked_patterns, *details, *length, garment])
+
+    category = _GARMENT_CATEGORIES.get(garment.split()[-1]) if garment else None
+    return CanonicalQuery(
+        text=text,
+        key=make_cache_key({"q": text}),
+        garment=garment,
+        category=category,
+        colors=picked_colors,
+        materials=picked_materials,
+        fit=picked_fit + length,
+        patterns=picked_patterns,
+        details=tuple(details)
+    )
@@ -1,16 +1,46 @@
 import os
 import httpx
-from typing import Dict, List, Any
+import logging
+from typing import Dict, List, Any, Optional
 import json
-import traceback
 
-from dotenv import load_dotenv
 from pydantic import BaseModel, Field
+from app.services.serpapi_client import fetch_shopping_results
+from app.services.outbound_scheduler import PRIORITY_INTERACTIVE
+from app.services.catalog_service import product_catalog
+from app.services.query_canonicalizer import canonicalize_query
+from app.utils.similarity_cache import SimilarQueryCache
+from app.utils.metrics import record_fallback
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-SEARCHAPI_BASE_URL = "https://serpapi.com/search"
+SEARCHAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com/search")
 SEARCHAPI_KEY = os.getenv("SERPAPI_API_KEY")
+QUERY_CANONICALIZATION_ENABLED = os.getenv("QUERY_CANONICALIZATION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Item descriptions are generated text and rarely repeat exactly, so results are
+# also cached by near-duplicate query (Jaccard similarity of the query words)
+SIMILAR_QUERY_THRESHOLD = float(os.getenv("SIMILAR_QUERY_THRESHOLD", "0.6"))
+SIMILAR_QUERY_CACHE_MAX_ENTRIES = int(os.getenv("SIMILAR_QUERY_CACHE_MAX_ENTRIES", "2048"))
+SIMILAR_QUERY_CACHE_TTL = float(os.getenv("SIMILAR_QUERY_CACHE_TTL", "21600"))
+
+similar_query_cache = SimilarQueryCache(
+    "similar_queries",
+    threshold=SIMILAR_QUERY_THRESHOLD,
+    max_entries=SIMILAR_QUERY_CACHE_MAX_ENTRIES,
+    ttl=SIMILAR_QUERY_CACHE_TTL
+)
+
+def similar_query_scope(query: str) -> Optional[str]:
+    """
+    Scope for the near-duplicate query cache: the garment and colors asked for,
+    so "slim black wool trousers" never answers "slim black wool blazer".
+    None when the query names no known garment; those only match exactly.
+    """
+    attributes = canonicalize_query(query)
+    if attributes.garment is None:
+        return None
+    return " ".join([attributes.garment, *attributes.colors])
 
 class Product(BaseModel):
     description: str = Field(...)
@@ -21,12 +51,16 @@ class Product(BaseModel):
 class StyleResponse(BaseModel):
     products: List[Product] = Field(...)
 
-async def search_products(query: str) -> List[Dict[str, Any]]:
+async def search_products(query: str, client: Optional[httpx.AsyncClient] = None, priority: int = PRIORITY_INTERACTIVE, canonicalize: bool = False) -> List[Dict[str, Any]]:
     """
     Search for products using SearchAPI.io
     
     Args:
         query: Search query string
+        client: Shared HTTP client (defaults to the application-scoped pool)
+        priority: Scheduling priority for the upstream request (user-facing searches by default)
+        canonicalize: Search for the canonical form of the query; for generated item
+            descriptions only, queries typed by users are searched as they are
     
     Returns:
         List[Dict]: List of product recommendations in the format:
@@ -44,6 +78,15 @@ async def search_products(query: str) -> List[Dict[str, Any]]:
     if not SEARCHAPI_KEY:
         raise ValueError("SEARCHAPI_KEY environment variable is not set")
     
+    # Search for the short canonical form of long generated descriptions
+    if canonicalize and QUERY_CANONICALIZATION_ENABLED:
+        canonical = canonicalize_query(query).text
+        if canonical and canonical != query:
+            logger.debug("Canonicalized query: '%s' -> '%s'", query, canonical)
+            query = canonical
+    
+    similar_scope = similar_query_scope(query)
+    
     params = {
         "q": query + " fashion clothing",
         "api_key": SEARCHAPI_KEY,
@@ -56,104 +99,43 @@ async def search_products(query: str) -> List[Dict[str, Any]]:
     }
     
     try:
-        print(f"Sending SerpAPI request for query: '{query}'")
-        async with httpx.AsyncClient(timeout=30.0) as client:  # Increased timeout
-            response = await client.get(SEARCHAPI_BASE_URL, params=params)
-            
-            # Log response status
-            print(f"SerpAPI response status: {response.status_code}")
-            
-            # Try to get response content even if status code indicates error
-            response_text = response.text
-            
-            # Raise for HTTP errors
-            response.raise_for_status()
-            
-            # Parse JSON response
-            try:
-                data = response.json()
-            except Exception as json_err:
-                print(f"Failed to parse JSON response: {str(json_err)}")
-                print(f"Response text: {response_text[:500]}...")  # Print first 500 chars
-                return []
-            
-            # Check for error in response
-            if "error" in data:
-                print(f"SerpAPI returned error: {data['error']}")
-                return []
-            
-            # Extract shopping results
-            shopping_results = data.get("shopping_results", [])
-            
-            if not shopping_results:
-                print(f"No shopping results found for query: '{query}'")
-                print(f"Response keys: {list(data.keys())}")
-                print(f"Response: {data}")
-            
-            # Process and format the results
-            recommendations = []
-            for item in shopping_results:
-                # Extract the correct product link
-                product_link = item.get("link", "")
-                
-                # If there's no link, try to get it from other fields
-                if not product_link:
-                    # Try to get from product_link field (sometimes SerpAPI uses this field)
-                    product_link = item.get("product_link", "")
-                    
-                    # If still no link, try to get from the source with the title
-                    if not product_link and item.get("source") and item.get("title"):
-                        source = item.get("source", "").lower()
-                        # Create a search URL based on the source
-                        if "amazon" in source:
-                            product_link = f"https://www.amazon.com/s?k={item.get('title', '').replace(' ', '+')}"
-                        elif "ebay" in source:
-                            product_link = f"https://www.ebay.com/sch/i.html?_nkw={item.get('title', '').replace(' ', '+')}"
-                        elif "etsy" in source:
-                            product_link = f"https://www.etsy.com/search?q={item.get('title', '').replace(' ', '+')}"
-                        elif "walmart" in source:
-                            product_link = f"https://www.walmart.com/search?q={item.get('title', '').replace(' ', '+')}"
-                        elif "target" in source:
-                            product_link = f"https://www.target.com/s?searchTerm={item.get('title', '').replace(' ', '+')}"
-                
-                # If the link doesn't start with http or https, add it
-                if product_link and not (product_link.startswith("http://") or product_link.startswith("https://")):
-                    product_link = "https://" + product_link
-                
-                # Check if the link is valid
-                if product_link:
-                    # Clean up the URL - remove any problematic characters
-                    product_link = product_link.strip()
-                    # Ensure there are no spaces in the URL
-                    product_link = product_link.replace(" ", "%20")
-                else:
-                    print(f"No product link found for item: {item.get('title', '')[:30]}...")
-                
-                # Add the search query that found this item
-                recommendation = {
-                    "description": item.get("title", ""),
-                    "productURL": product_link,
-                    "price": item.get("price", ""),
-                    "thumbnailURL": item.get("thumbnail", ""),
-                    "rating": item.get("rating", None),
-                }
-                recommendations.append(recommendation)
-            
-            print(f"Found {len(recommendations)} recommendations for query: '{query}'")
-            
-            # Limit to requested number of results
-            return recommendations[:10]
+        # A near-identical query was answered recently
+        cached = similar_query_cache.get(query, scope=similar_scope or "", similar=similar_scope is not None)
+        if cached is not None:
+            logger.debug("Similar query cache hit for query: '%s'", query)
+            return cached
+        
+        # Answer from the local catalog when it already has enough close matches
+        local_products = await product_catalog.lookup(query, k=10)
+        if local_products is not None:
+            logger.debug("Catalog hit for query: '%s' (%d products)", query, len(local_products))
+            return [product.to_recommendation() for product in local_products]
+        
+        logger.debug("Sending SerpAPI request for query: '%s'", query)
+        products = await fetch_shopping_results(SEARCHAPI_BASE_URL, params, client=client, priority=priority)
+        logger.debug("Found %d products for query: '%s'", len(products), query)
+        
+        # Keep every product we've seen so similar searches can be answered locally
+        product_catalog.ingest(products)
+        
+        # Only the returned results are converted to the response format
+        recommendations = [product.to_recommendation() for product in products[:10]]
+        if recommendations:
+            similar_query_cache.set(query, recommendations, scope=similar_scope or "")
+        return recommendations
     except httpx.TimeoutException:
-        print(f"Timeout error for SerpAPI query '{query}': Request timed out")
+        logger.warning("Timeout error for SerpAPI query '%s': Request timed out", query)
+        record_fallback("empty_product_results")
         return []
     except httpx.RequestError as e:
-        print(f"Request error for SerpAPI query '{query}': {str(e)}")
+        logger.warning("Request error for SerpAPI query '%s': %s", query, e)
+        record_fallback("empty_product_results")
         return []
     except httpx.HTTPStatusError as e:
-        print(f"HTTP error for SerpAPI query '{query}': {e.response.status_code} - {str(e)}")
-        print(f"Response content: {e.response.text[:500]}...")  # Print first 500 chars
+        logger.warning("HTTP error for SerpAPI query '%s': %d - %s; response content: %.500s", query, e.response.status_code, e, e.response.text)
+        record_fallback("empty_product_results")
         return []
     except Exception as e:
-        print(f"Unexpected error for SerpAPI query '{query}': {str(e)}")
-        print(f"Error details: {traceback.format_exc()}")
+        logger.exception("Unexpected error for SerpAPI query '%s': %s", query, e)
+        record_fallback("empty_product_results")
         return []
\ No newline at end of file
@@ -0,0 +1,329 @@
+import os
+import time
+import email.utils
+import random
+import asyncio
+import logging
+import httpx
+from typing import Dict, List, Any, Optional
+
+from app.services.http_client import get_http_client
+from app.services.outbound_scheduler import serpapi_scheduler, PRIORITY_DEFAULT
+from app.services.product_result import ProductResult, normalize_shopping_result
+from app.utils.cache import TTLCache, make_cache_key
+from app.utils.fast_json import decode_array_field, loads
+from app.utils.latency import LatencyTracker
+from app.utils.metrics import PAYLOAD_BYTES, STAGE_DURATION, UPSTREAM_REQUESTS
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Shopping results cache settings
+SHOPPING_CACHE_TTL = float(os.getenv("SHOPPING_CACHE_TTL", "21600"))
+SHOPPING_CACHE_MAX_ENTRIES = int(os.getenv("SHOPPING_CACHE_MAX_ENTRIES", "2048"))
+SHOPPING_CACHE_DB = os.getenv("SHOPPING_CACHE_DB", "")
+
+# Parameters that don't change the results and must not end up in cache keys
+_UNCACHED_PARAMS = {"api_key"}
+
+# Normalized ProductResults in memory; plain dicts on disk (older raw entries normalize the same way)
+shopping_cache = TTLCache(
+    "shopping",
+    max_entries=SHOPPING_CACHE_MAX_ENTRIES,
+    ttl=SHOPPING_CACHE_TTL,
+    db_path=SHOPPING_CACHE_DB or None,
+    encode=lambda products: [product.to_dict() for product in products],
+    decode=lambda items: [normalize_shopping_result(item) for item in items]
+)
+
+# Adaptive timeout: a multiple of the observed p99, clamped; the max applies until enough samples exist
+SERPAPI_MIN_TIMEOUT = float(os.getenv("SERPAPI_MIN_TIMEOUT", "2.0"))
+SERPAPI_MAX_TIMEOUT = float(os.getenv("SERPAPI_MAX_TIMEOUT", "30.0"))
+SERPAPI_TIMEOUT_MULTIPLIER = float(os.getenv("SERPAPI_TIMEOUT_MULTIPLIER", "3.0"))
+SERPAPI_LATENCY_MIN_SAMPLES = int(os.getenv("SERPAPI_LATENCY_MIN_SAMPLES", "20"))
+
+# Hedging: send a duplicate request once the first has been outstanding longer than this percentile
+SERPAPI_HEDGE_ENABLED = os.getenv("SERPAPI_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+SERPAPI_HEDGE_PERCENTILE = float(os.getenv("SERPAPI_HEDGE_PERCENTILE", "95"))
+
+# Retries with jittered exponential backoff for transient failures
+SERPAPI_MAX_RETRIES = int(os.getenv("SERPAPI_MAX_RETRIES", "2"))
+SERPAPI_RETRY_BASE_DELAY = float(os.getenv("SERPAPI_RETRY_BASE_DELAY", "0.25"))
+SERPAPI_RETRY_MAX_DELAY = float(os.getenv("SERPAPI_RETRY_MAX_DELAY", "2.0"))
+# Overall budget for a search, all attempts, queueing and backoff included; each attempt's
+# timeout is capped by what is left after it gets a scheduler slot, and no retry starts with less than SERPAPI_MIN_TIMEOUT left
+SERPAPI_TOTAL_TIMEOUT = float(os.getenv("SERPAPI_TOTAL_TIMEOUT", "30.0"))
+# Statuses worth retrying: rate limiting and transient gateway/server failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+upstream_stats = {
+    "requests": 0,
+    "errors": 0,
+    "retries": 0,
+    "hedged": 0,
+    "hedge_wins": 0
+}
+
+upstream_latency = LatencyTracker()
+
+# Identical searches issued concurrently share one upstream request
+shopping_flight = SingleFlight("shopping")
+
+def shopping_cache_key(base_url: str, params: Dict[str, Any]) -> str:
+    """
+    Build the cache key for a shopping search from its normalized request parameters.
+
+    Args:
+        base_url: Upstream endpoint
+        params: Query parameters sent to SerpAPI
+
+    Returns:
+        str: Stable cache key
+    """
+    normalized = {
+        key: (" ".join(str(value).lower().split()) if key == "q" else value)
+        for key, value in params.items()
+        if key not in _UNCACHED_PARAMS
+    }
+    normalized["_url"] = base_url
+    return make_cache_key(normalized)
+
+async def fetch_shopping_results(base_url: str, params: Dict[str, Any], client: Optional[httpx.AsyncClient] = None, cache_ttl: Optional[float] = None, priority: int = PRIORITY_DEFAULT) -> List[ProductResult]:
+    """
+    Fetch the normalized shopping results for a query, serving repeat queries from cache.
+
+    HTTP errors are raised to the caller; API-level errors and unparseable
+    responses return an empty list and are not cached.
+
+    Args:
+        base_url: Upstream endpoint
+        params: Query parameters sent to SerpAPI
+        client: Shared HTTP client (defaults to the application-scoped pool)
+        cache_ttl: How long to cache the results (defaults to SHOPPING_CACHE_TTL)
+        priority: Scheduling priority when the SerpAPI quota is saturated
+
+    Returns:
+        List[ProductResult]: Normalized shopping results, shared with the cache (copy before modifying)
+    """
+    cache_key = shopping_cache_key(base_url, params)
+    cached = await shopping_cache.aget(cache_key)
+    if cached is not None:
+        logger.debug("Shopping cache hit for query: '%s'", params.get("q"))
+        return cached
+
+    return await shopping_flight.do(
+        cache_key,
+        lambda: _fetch_uncached(base_url, params, cache_key, client or get_http_client(), cache_ttl, priority)
+    )
+
+async def _fetch_uncached(base_url: str, params: Dict[str, Any], cache_key: str, client: httpx.AsyncClient, cache_ttl: Optional[float], priority: int) -> List[ProductResult]:
+    response = await send_with_retries(client, base_url, params, priority)
+
+    logger.debug("SerpAPI response status: %d", response.status_code)
+
+    # Raise for HTTP errors
+    response.raise_for_status()
+
+    # Decode only the results array; the rest of the response is never read
+    shopping_results = decode_array_field(response.content, "shopping_results")
+    if shopping_results is None:
+        # No results array: parse everything to find out why
+        try:
+            data = loads(response.content)
+        except ValueError as json_err:
+            upstream_stats["errors"] += 1
+            logger.warning("Failed to parse JSON response: %s; response text: %.500s", json_err, response.text)
+            return []
+
+        # Check for error in response
+        if isinstance(data, dict) and "error" in data:
+            upstream_stats["errors"] += 1
+            logger.warning("SerpAPI returned error: %s", data["error"])
+            return []
+        shopping_results = data.get("shopping_results") if isinstance(data, dict) else None
+        if not isinstance(shopping_results, list):
+            logger.info("No shopping results found for query: '%s' (response keys: %s)", params.get("q"), list(data) if isinstance(data, dict) else type(data).__name__)
+            return []
+
+    products = [normalize_shopping_result(item) for item in shopping_results if isinstance(item, dict)]
+    if not products:
+        logger.info("No shopping results found for query: '%s'", params.get("q"))
+        return []
+
+    shopping_cache.set(cache_key, products, ttl=cache_ttl)
+    return products
+
+def adaptive_timeout() -> float:
+    """
+    Per-request timeout derived from observed upstream latency.
+    """
+    if len(upstream_latency) < SERPAPI_LATENCY_MIN_SAMPLES:
+        return SERPAPI_MAX_TIMEOUT
+    p99 = upstream_latency.percentile(99)
+    return min(SERPAPI_MAX_TIMEOUT, max(SERPAPI_MIN_TIMEOUT, p99 * SERPAPI_TIMEOUT_MULTIPLIER))
+
+def hedge_delay() -> Optional[float]:
+    """
+    How long to wait before sending a hedged duplicate, or None when hedging is off.
+    """
+    if not SERPAPI_HEDGE_ENABLED or len(upstream_latency) < SERPAPI_LATENCY_MIN_SAMPLES:
+        return None
+    return upstream_latency.percentile(SERPAPI_HEDGE_PERCENTILE)
+
+def _is_retryable(result: Any) -> bool:
+    if isinstance(result, httpx.Response):
+        return result.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(result, httpx.TransportError)
+
+async def _send_once(client: httpx.AsyncClient, base_url: str, params: Dict[str, Any], priority: int, deadline: float) -> httpx.Response:
+    # All SerpAPI traffic goes through the process-wide rate limiter; the wait
+    # for a slot counts against the same time budget as the request itself
+    queued = time.perf_counter()
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise httpx.PoolTimeout("SerpAPI time budget spent before the request was queued")
+    try:
+        await asyncio.wait_for(serpapi_scheduler.acquire(priority), remaining)
+    except asyncio.TimeoutError:
+        UPSTREAM_REQUESTS.inc(service="serpapi", outcome="queue_timeout")
+        raise httpx.PoolTimeout("SerpAPI time budget spent waiting for a request slot") from None
+    try:
+        upstream_stats["requests"] += 1
+        started = time.perf_counter()
+        STAGE_DURATION.observe(started - queued, stage="serpapi_queue_wait")
+        timeout = min(adaptive_timeout(), deadline - time.monotonic())
+        if timeout <= 0:
+            raise httpx.PoolTimeout("SerpAPI time budget spent waiting for a request slot")
+        try:
+            response = await client.get(base_url, params=params, timeout=timeout)
+        except httpx.TimeoutException:
+            # Count timeouts at their full duration so the window reflects a slowing upstream
+            upstream_latency.observe(time.perf_counter() - started)
+            upstream_stats["errors"] += 1
+            UPSTREAM_REQUESTS.inc(service="serpapi", outcome="timeout")
+            raise
+        except httpx.HTTPError:
+            upstream_stats["errors"] += 1
+            UPSTREAM_REQUESTS.inc(service="serpapi", outcome="error")
+            raise
+    finally:
+        serpapi_scheduler.release()
+    STAGE_DURATION.observe(time.perf_counter() - started, stage="serpapi_request")
+    UPSTREAM_REQUESTS.inc(service="serpapi", outcome=str(response.status_code))
+    PAYLOAD_BYTES.observe(len(response.content), kind="serpapi_response")
+    if response.is_error:
+        upstream_stats["errors"] += 1
+    else:
+        upstream_latency.observe(time.perf_counter() - started)
+    return response
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    Parse a Retry-After header (delay in seconds or an HTTP date), if present.
+    """
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+async def _send_hedged(client: httpx.AsyncClient, base_url: str, params: Dict[str, Any], priority: int, deadline: float) -> httpx.Response:
+    """
+    Send one request, plus a duplicate if the first is slower than the hedge delay.
+    The first successful response wins and the other request is cancelled.
+    """
+    delay = hedge_delay()
+    primary = asyncio.create_task(_send_once(client, base_url, params, priority, deadline))
+    if delay is None:
+        return await primary
+
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            upstream_stats["hedged"] += 1
+            logger.info("Hedging SerpAPI query '%s' after %.0f ms", params.get("q"), delay * 1000)
+            pending.add(asyncio.create_task(_send_once(client, base_url, params, priority, deadline)))
+
+        last_task = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                last_task = task
+                if task.exception() is None and not task.result().is_error:
+                    if task is not primary:
+                        upstream_stats["hedge_wins"] += 1
+                    return task.result()
+        # Every attempt failed; surface the last failure
+        return last_task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def send_with_retries(client: httpx.AsyncClient, base_url: str, params: Dict[str, Any], priority: int = PRIORITY_DEFAULT) -> httpx.Response:
+    """
+    Send a SerpAPI GET with adaptive timeouts, optional hedging and jittered
+    exponential backoff. Only transient failures (transport errors, timeouts,
+    429 and 5xx gateway statuses) are retried; searches are idempotent GETs.
+    All attempts share SERPAPI_TOTAL_TIMEOUT, and a 429's Retry-After is
+    waited out (or the response returned if it doesn't fit the budget).
+
+    Returns:
+        httpx.Response: The final response (which may still be an HTTP error)
+    """
+    deadline = time.monotonic() + SERPAPI_TOTAL_TIMEOUT
+    attempt = 0
+    while True:
+        error: Optional[httpx.HTTPError] = None
+        retry_after = None
+        try:
+            response = await _send_hedged(client, base_url, params, priority, deadline)
+            if attempt >= SERPAPI_MAX_RETRIES or not _is_retryable(response):
+                return response
+            reason = f"HTTP {response.status_code}"
+            if response.status_code == 429:
+                retry_after = retry_after_seconds(response)
+        except httpx.HTTPError as e:
+            if attempt >= SERPAPI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            reason = type(e).__name__
+            error = e
+
+        # Full jitter keeps retries from many requests from synchronizing
+        delay = random.uniform(0, min(SERPAPI_RETRY_MAX_DELAY, SERPAPI_RETRY_BASE_DELAY * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if deadline - time.monotonic() - delay < SERPAPI_MIN_TIMEOUT:
+            logger.info("Not retrying SerpAPI query '%s' after %s: out of time budget", params.get("q"), reason)
+            if error is not None:
+                raise error
+            return response
+        attempt += 1
+        upstream_stats["retries"] += 1
+        logger.info(
+            "Retrying SerpAPI query '%s' after %s (attempt %d/%d, backoff %.0f ms)",
+            params.get("q"), reason, attempt, SERPAPI_MAX_RETRIES, delay * 1000
+        )
+        await asyncio.sleep(delay)
+
+def get_shopping_stats() -> Dict[str, Any]:
+    """
+    Return shopping cache counters, upstream call counts, coalescing and scheduler queue metrics.
+    """
+    return {
+        "cache": shopping_cache.stats(),
+        "upstream": dict(upstream_stats),
+        "single_flight": shopping_flight.stats(),
+        "latency": {
+            **upstream_latency.summary(),
+            "timeout_seconds": round(adaptive_timeout(), 3),
+            "hedge_delay_ms": round(hedge_delay() * 1000, 1) if hedge_delay() is not None else None
+        },
+        "scheduler": serpapi_scheduler.stats()
+    }
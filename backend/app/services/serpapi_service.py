@@ -1,16 +1,20 @@
 import os
 import httpx
-from typing import Dict, List, Any, Tuple
-import dotenv
+from typing import Dict, List, Any, Optional, Tuple
 import asyncio
-import traceback
 import re
+import logging
+from app.services.http_client import get_http_client
+from app.services.serpapi_client import fetch_shopping_results, send_with_retries
+from app.services.outbound_scheduler import PRIORITY_DEFAULT, PRIORITY_BACKFILL
+from app.services.catalog_service import product_catalog
+from app.services.product_result import ProductResult
+from app.utils.metrics import record_fallback
 
-# Load environment variables explicitly
-dotenv.load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
+logger = logging.getLogger(__name__)
 
-# SerpAPI base URL
-SERPAPI_BASE_URL = "https://serpapi.com/search"
+# SerpAPI base URL (overridable to point at a local stand-in, see benchmarks/fake_upstreams.py)
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com/search")
 
 # Define clothing categories
 CLOTHING_CATEGORIES = {
@@ -22,13 +26,14 @@ CLOTHING_CATEGORIES = {
     "accessories": ["bag", "purse", "backpack", "wallet", "belt", "scarf", "hat", "gloves", "socks", "jewelry", "watch", "sunglasses"]
 }
 
-async def search_fashion_items(search_queries: List[str], results_per_query: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+async def search_fashion_items(search_queries: List[str], results_per_query: int = 5, client: Optional[httpx.AsyncClient] = None) -> Dict[str, List[Dict[str, Any]]]:
     """
     Search for fashion items using SerpAPI based on multiple generated search queries.
     
     Args:
         search_queries: List of search queries generated by OpenAI
         results_per_query: Number of results to return per query (default: 5)
+        client: Shared HTTP client (defaults to the application-scoped pool)
     
     Returns:
         Dict[str, List[Dict]]: Dictionary of categorized fashion recommendations
@@ -37,7 +42,9 @@ async def search_fashion_items(search_queries: List[str], results_per_query: int
     if not api_key:
         raise ValueError("SERPAPI_API_KEY environment variable is not set")
     
-    print(f"Using SerpAPI with key: {api_key[:5]}...{api_key[-5:]}")
+    logger.debug("Using SerpAPI with key: %s...%s", api_key[:5], api_key[-5:])
+    
+    client = client or get_http_client()
     
     # Create a dictionary to store categorized recommendations
     categorized_recommendations = {
@@ -55,7 +62,7 @@ async def search_fashion_items(search_queries: List[str], results_per_query: int
     # Process each search query
     tasks = []
     for query in search_queries:
-        task = search_single_query(query, api_key, results_per_query)
+        task = search_single_query(query, api_key, results_per_query, client=client)
         tasks.append(task)
     
     # Run all search queries concurrently
@@ -64,12 +71,12 @@ async def search_fashion_items(search_queries: List[str], results_per_query: int
     # Combine results
     for result in results:
         if isinstance(result, Exception):
-            print(f"Query failed with exception: {str(result)}")
+            logger.warning("Query failed with exception: %s", result)
             continue
         if isinstance(result, list):  # Skip exceptions
             all_recommendations.extend(result)
     
-    print(f"Total recommendations found: {len(all_recommendations)}")
+    logger.debug("Total recommendations found: %d", len(all_recommendations))
     
     # Categorize recommendations
     for item in all_recommendations:
@@ -78,56 +85,104 @@ async def search_fashion_items(search_queries: List[str], results_per_query: int
             # Add to the appropriate category
             categorized_recommendations[category].append(item)
     
-    # If any category is empty, try to fill it with items from other categories
-    for category in categorized_recommendations:
-        if not categorized_recommendations[category]:
-            print(f"No items found for category: {category}. Attempting to find items...")
-            # Try to find items for this category by making a specific search
-            category_items = await search_for_category(category, api_key, results_per_query)
+    # If any category is empty, fill all of them with category-specific searches in one concurrent batch
+    empty_categories = [category for category, items in categorized_recommendations.items() if not items]
+    if empty_categories:
+        logger.info("No items found for categories: %s. Attempting to find items...", ", ".join(empty_categories))
+        record_fallback("category_backfill", len(empty_categories))
+        backfill_results = await asyncio.gather(*(
+            search_for_category(category, api_key, results_per_query, client=client)
+            for category in empty_categories
+        ), return_exceptions=True)
+        for category, category_items in zip(empty_categories, backfill_results):
+            if isinstance(category_items, Exception):
+                logger.warning("Backfill for category %s failed with exception: %s", category, category_items)
+                continue
             categorized_recommendations[category] = category_items
     
-    # Limit the number of items per category to avoid overwhelming the user
-    for category in categorized_recommendations:
-        if len(categorized_recommendations[category]) > results_per_query:
-            categorized_recommendations[category] = categorized_recommendations[category][:results_per_query]
-    
-    return categorized_recommendations
+    # Limit the number of items per category to avoid overwhelming the user, then convert for the response
+    return {
+        category: [item.to_dict() for item in items[:results_per_query]]
+        for category, items in categorized_recommendations.items()
+    }
+
+# Fixed queries used to backfill categories that came back empty
+CATEGORY_FALLBACK_QUERIES = {
+    "tops": "stylish shirts tops",
+    "bottoms": "stylish pants trousers jeans",
+    "dresses": "stylish dresses",
+    "outerwear": "stylish jackets coats",
+    "shoes": "stylish shoes footwear",
+    "accessories": "fashion accessories"
+}
+CATEGORY_FALLBACK_CACHE_TTL = float(os.getenv("CATEGORY_FALLBACK_CACHE_TTL", "86400"))
+
+# Keyword lookup tables for categorize_item, built once from CLOTHING_CATEGORIES.
+# A single-word keyword matches r'\bkeyword\b' exactly when it is one of the text's \w+ runs,
+# so those become a set lookup; keywords containing other characters (e.g. "t-shirt")
+# go through one precompiled pattern.
+_CATEGORY_ORDER = list(CLOTHING_CATEGORIES)
+_WORD_KEYWORDS: Dict[str, int] = {}
+_COMPOUND_KEYWORDS: Dict[str, int] = {}
+for _index, _keywords in enumerate(CLOTHING_CATEGORIES.values()):
+    for _keyword in _keywords:
+        _table = _WORD_KEYWORDS if re.fullmatch(r'\w+', _keyword) else _COMPOUND_KEYWORDS
+        _table.setdefault(_keyword, _index)
+_WORD_RE = re.compile(r'\w+')
+# Lookahead so overlapping keywords are all found; alternatives in category order
+_COMPOUND_RE = re.compile(
+    r'(?=\b(' + '|'.join(re.escape(keyword) for keyword in sorted(_COMPOUND_KEYWORDS, key=_COMPOUND_KEYWORDS.get)) + r')\b)'
+) if _COMPOUND_KEYWORDS else None
+# (keyword, category) pairs in the original priority order for the substring fallback
+_KEYWORD_PRIORITY: List[Tuple[str, str]] = [
+    (keyword, category) for category, keywords in CLOTHING_CATEGORIES.items() for keyword in keywords
+]
 
-def categorize_item(item: Dict[str, Any]) -> str:
+def categorize_item(item: ProductResult) -> str:
     """
     Categorize a fashion item based on its title and search query.
     
+    The first category (in CLOTHING_CATEGORIES order) with a whole-word keyword
+    match wins, then the first with a substring match in the search query.
+    
     Args:
         item: The fashion item to categorize
     
     Returns:
         str: The category of the item
     """
-    title = item.get("title", "").lower()
-    search_query = item.get("search_query", "").lower()
+    title = item.title.lower()
+    search_query = item.search_query.lower()
     
     # Check both title and search query for category keywords
     text_to_check = title + " " + search_query
     
-    # Try to categorize based on keywords
-    for category, keywords in CLOTHING_CATEGORIES.items():
-        for keyword in keywords:
-            # Use word boundaries to avoid partial matches
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, text_to_check):
-                return category
+    # Try to categorize based on whole-word keyword matches
+    best = len(_CATEGORY_ORDER)
+    for word in _WORD_RE.findall(text_to_check):
+        index = _WORD_KEYWORDS.get(word)
+        if index is not None and index < best:
+            best = index
+            if best == 0:
+                break
+    if best > 0 and _COMPOUND_RE is not None:
+        for match in _COMPOUND_RE.finditer(text_to_check):
+            index = _COMPOUND_KEYWORDS[match.group(1)]
+            if index < best:
+                best = index
+    if best < len(_CATEGORY_ORDER):
+        return _CATEGORY_ORDER[best]
     
     # If no category was found, try to determine from the search query
     # This is a fallback mechanism
-    for category, keywords in CLOTHING_CATEGORIES.items():
-        for keyword in keywords:
-            if keyword in search_query:
-                return category
+    for keyword, category in _KEYWORD_PRIORITY:
+        if keyword in search_query:
+            return category
     
     # Default to tops if no category is found
     return "tops"
 
-async def search_for_category(category: str, api_key: str, num_results: int = 5) -> List[Dict[str, Any]]:
+async def search_for_category(category: str, api_key: str, num_results: int = 5, client: Optional[httpx.AsyncClient] = None) -> List[ProductResult]:
     """
     Search specifically for items in a given category.
     
@@ -135,37 +190,48 @@ async def search_for_category(category: str, api_key: str, num_results: int = 5)
         category: The category to search for
         api_key: SerpAPI key
         num_results: Number of results to return
+        client: Shared HTTP client (defaults to the application-scoped pool)
     
     Returns:
-        List[Dict]: List of fashion recommendations for the category
+        List[ProductResult]: Fashion recommendations for the category
     """
     # Create a specific query for the category
-    if category == "tops":
-        query = "stylish shirts tops"
-    elif category == "bottoms":
-        query = "stylish pants trousers jeans"
-    elif category == "dresses":
-        query = "stylish dresses"
-    elif category == "outerwear":
-        query = "stylish jackets coats"
-    elif category == "shoes":
-        query = "stylish shoes footwear"
-    elif category == "accessories":
-        query = "fashion accessories"
-    else:
-        query = f"fashion {category}"
+    query = CATEGORY_FALLBACK_QUERIES.get(category, f"fashion {category}")
     
     # Search for items in this category
-    results = await search_single_query(query, api_key, num_results)
+    # The fallback queries never change, so their results are cached longer than regular searches
+    results = await search_single_query(
+        query, api_key, num_results, client=client, cache_ttl=CATEGORY_FALLBACK_CACHE_TTL, priority=PRIORITY_BACKFILL
+    )
     
-    # Mark these items with the correct category
+    # Mark these items with the correct category (they are per-request copies)
     for item in results:
-        item["category"] = category
-        item["search_query"] = query
+        item.category = category
+        item.search_query = query
     
     return results
 
-async def search_single_query(search_query: str, api_key: str, num_results: int = 5) -> List[Dict[str, Any]]:
+async def prewarm_category_fallbacks(results_per_query: int = 5, client: Optional[httpx.AsyncClient] = None) -> None:
+    """
+    Fetch every category fallback query once so later backfills are served from cache.
+    
+    Args:
+        results_per_query: Must match the value search_fashion_items is called with
+        client: Shared HTTP client (defaults to the application-scoped pool)
+    """
+    api_key = os.getenv("SERPAPI_API_KEY")
+    if not api_key:
+        logger.info("Skipping category fallback prewarm: SERPAPI_API_KEY is not set")
+        return
+    
+    results = await asyncio.gather(*(
+        search_for_category(category, api_key, results_per_query, client=client)
+        for category in CATEGORY_FALLBACK_QUERIES
+    ), return_exceptions=True)
+    warmed = sum(1 for result in results if isinstance(result, list) and result)
+    logger.info("Prewarmed %d/%d category fallback queries", warmed, len(CATEGORY_FALLBACK_QUERIES))
+
+async def search_single_query(search_query: str, api_key: str, num_results: int = 5, client: Optional[httpx.AsyncClient] = None, cache_ttl: Optional[float] = None, priority: int = PRIORITY_DEFAULT) -> List[ProductResult]:
     """
     Search for fashion items using a single query.
     
@@ -173,9 +239,12 @@ async def search_single_query(search_query: str, api_key: str, num_results: int
         search_query: The search query
         api_key: SerpAPI key
         num_results: Number of results to return
+        client: Shared HTTP client (defaults to the application-scoped pool)
+        cache_ttl: How long to cache the results (defaults to the shopping cache TTL)
+        priority: Scheduling priority for the upstream request
     
     Returns:
-        List[Dict]: List of fashion recommendations
+        List[ProductResult]: Fashion recommendations tagged with the search query
     """
     # Prepare query parameters
     params = {
@@ -190,109 +259,30 @@ async def search_single_query(search_query: str, api_key: str, num_results: int
     }
     
     try:
-        print(f"Sending SerpAPI request for query: '{search_query}'")
-        async with httpx.AsyncClient(timeout=30.0) as client:  # Increased timeout
-            response = await client.get(SERPAPI_BASE_URL, params=params)
-            
-            # Log response status
-            print(f"SerpAPI response status: {response.status_code}")
-            
-            # Try to get response content even if status code indicates error
-            response_text = response.text
-            
-            # Raise for HTTP errors
-            response.raise_for_status()
-            
-            # Parse JSON response
-            try:
-                data = response.json()
-            except Exception as json_err:
-                print(f"Failed to parse JSON response: {str(json_err)}")
-                print(f"Response text: {response_text[:500]}...")  # Print first 500 chars
-                return []
-            
-            # Check for error in response
-            if "error" in data:
-                print(f"SerpAPI returned error: {data['error']}")
-                return []
-            
-            # Extract shopping results
-            shopping_results = data.get("shopping_results", [])
-            
-            if not shopping_results:
-                print(f"No shopping results found for query: '{search_query}'")
-                print(f"Response keys: {list(data.keys())}")
-            
-            # Process and format the results
-            recommendations = []
-            for item in shopping_results:
-                # Extract the correct product link
-                product_link = item.get("link", "")
-                
-                # If there's no link, try to get it from other fields
-                if not product_link:
-                    # Try to get from product_link field (sometimes SerpAPI uses this field)
-                    product_link = item.get("product_link", "")
-                    
-                    # If still no link, try to get from the source with the title
-                    if not product_link and item.get("source") and item.get("title"):
-                        source = item.get("source", "").lower()
-                        # Create a search URL based on the source
-                        if "amazon" in source:
-                            product_link = f"https://www.amazon.com/s?k={item.get('title', '').replace(' ', '+')}"
-                        elif "ebay" in source:
-                            product_link = f"https://www.ebay.com/sch/i.html?_nkw={item.get('title', '').replace(' ', '+')}"
-                        elif "etsy" in source:
-                            product_link = f"https://www.etsy.com/search?q={item.get('title', '').replace(' ', '+')}"
-                        elif "walmart" in source:
-                            product_link = f"https://www.walmart.com/search?q={item.get('title', '').replace(' ', '+')}"
-                        elif "target" in source:
-                            product_link = f"https://www.target.com/s?searchTerm={item.get('title', '').replace(' ', '+')}"
-                
-                # If the link doesn't start with http or https, add it
-                if product_link and not (product_link.startswith("http://") or product_link.startswith("https://")):
-                    product_link = "https://" + product_link
-                
-                # Check if the link is valid
-                if product_link:
-                    # Clean up the URL - remove any problematic characters
-                    product_link = product_link.strip()
-                    # Ensure there are no spaces in the URL
-                    product_link = product_link.replace(" ", "%20")
-                else:
-                    print(f"No product link found for item: {item.get('title', '')[:30]}...")
-                
-                # Add the search query that found this item
-                recommendation = {
-                    "title": item.get("title", ""),
-                    "link": product_link,
-                    "source": item.get("source", ""),
-                    "price": item.get("price", ""),
-                    "thumbnail": item.get("thumbnail", ""),
-                    "rating": item.get("rating", None),
-                    "reviews": item.get("reviews", None),
-                    "extensions": item.get("extensions", []),
-                    "search_query": search_query  # Add the search query for reference
-                }
-                recommendations.append(recommendation)
-            
-            print(f"Found {len(recommendations)} recommendations for query: '{search_query}'")
+        logger.debug("Sending SerpAPI request for query: '%s'", search_query)
+        products = await fetch_shopping_results(SERPAPI_BASE_URL, params, client=client, cache_ttl=cache_ttl, priority=priority)
+        logger.debug("Found %d recommendations for query: '%s'", len(products), search_query)
+        
+        # Keep every product we've seen so similar searches can be answered locally
+        product_catalog.ingest(products)
             
-            # Limit to requested number of results
-            return recommendations[:num_results]
+        # Limit to requested number of results; copies, since the cached results are shared
+        return [product.with_query(search_query) for product in products[:num_results]]
     except httpx.TimeoutException:
-        print(f"Timeout error for SerpAPI query '{search_query}': Request timed out")
+        logger.warning("Timeout error for SerpAPI query '%s': Request timed out", search_query)
+        record_fallback("empty_product_results")
         return []
     except httpx.RequestError as e:
-        print(f"Request error for SerpAPI query '{search_query}': {str(e)}")
+        logger.warning("Request error for SerpAPI query '%s': %s", search_query, e)
+        record_fallback("empty_product_results")
         return []
     except httpx.HTTPStatusError as e:
-        print(f"HTTP error for SerpAPI query '{search_query}': {e.response.status_code} - {str(e)}")
-        print(f"Response content: {e.response.text[:500]}...")  # Print first 500 chars
+        logger.warning("HTTP error for SerpAPI query '%s': %d - %s; response content: %.500s", search_query, e.response.status_code, e, e.response.text)
+        record_fallback("empty_product_results")
         return []
     except Exception as e:
-        print(f"Unexpected error for SerpAPI query '{search_query}': {str(e)}")
-        print(f"Error details: {traceback.format_exc()}")
+        logger.exception("Unexpected error for SerpAPI query '%s': %s", search_query, e)
+        record_fallback("empty_product_results")
         return []
 
 async def test_serpapi_connection():
@@ -301,10 +291,10 @@ async def test_serpapi_connection():
     """
     api_key = os.getenv("SERPAPI_API_KEY")
     if not api_key:
-        print("ERROR: SERPAPI_API_KEY environment variable is not set")
+        logger.error("SERPAPI_API_KEY environment variable is not set")
         return False
     
-    print(f"Testing SerpAPI connection with key: {api_key[:5]}...{api_key[-5:]}")
+    logger.info("Testing SerpAPI connection with key: %s...%s", api_key[:5], api_key[-5:])
     
     # Simple test query
     test_query = "test query"
@@ -320,19 +310,19 @@ async def test_serpapi_connection():
     }
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(SERPAPI_BASE_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
+        # Through the scheduler like every other SerpAPI call, behind user searches
+        response = await send_with_retries(get_http_client(), SERPAPI_BASE_URL, params, priority=PRIORITY_BACKFILL)
+        response.raise_for_status()
+        data = response.json()
             
-            if "error" in data:
-                print(f"SerpAPI test failed: {data['error']}")
-                return False
+        if "error" in data:
+            logger.error("SerpAPI test failed: %s", data["error"])
+            return False
             
-            print("SerpAPI connection test successful")
-            return True
+        logger.info("SerpAPI connection test successful")
+        return True
     except Exception as e:
-        print(f"SerpAPI test failed: {str(e)}")
+        logger.error("SerpAPI test failed: %s", e)
         return False
 
 # Run the test when the module is imported
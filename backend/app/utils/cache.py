@@ -0,0 +1,400 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marks a lookup that found nothing (None is a valid cached value)
+_MISSING = object()
+
+def make_cache_key(data: Any) -> str:
+    """
+    Build a stable cache key from a JSON-serializable value.
+
+    Args:
+        data: Value to fingerprint (dict keys are sorted, so ordering doesn't matter)
+
+    Returns:
+        str: Hex SHA-256 digest of the canonical JSON encoding
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def make_content_key(blobs: List[bytes]) -> str:
+    """
+    Build a content-addressed key for one or more binary payloads (e.g. uploaded images).
+
+    Args:
+        blobs: Raw bytes; order matters
+
+    Returns:
+        str: Hex SHA-256 digest over the per-blob digests
+    """
+    digest = hashlib.sha256()
+    for blob in blobs:
+        digest.update(hashlib.sha256(blob).digest())
+    return digest.hexdigest()
+
+def estimate_size(value: Any) -> int:
+    """
+    Approximate the memory held by a cached value: the length of raw bytes,
+    or of the compact JSON encoding for anything else.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+class TTLCache:
+    """
+    Two-tier cache: an in-process LRU with per-entry TTL, optionally backed by
+    a SQLite table so entries survive restarts.
+
+    Values stored in the disk tier must be JSON-serializable, or converted by
+    the encode/decode hooks (e.g. for objects kept in a compact form in
+    memory). With max_bytes set, least recently used entries are also evicted
+    to keep the estimated size of the memory tier within that budget.
+
+    Disk writes are queued and committed in batches by a background thread,
+    which also purges expired rows every purge_interval seconds; from async
+    code, use aget so a memory miss reads the disk tier off the event loop.
+    Values must not be modified after they are stored.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        db_path: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        encode: Optional[Callable[[Any], Any]] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+        flush_interval: float = 1.0,
+        purge_interval: float = 600.0
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        # Conversions to and from the JSON stored in the disk tier
+        self._encode = encode
+        self._decode = decode
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        # Serializes use of the connection between the writer and readers
+        self._db_lock = threading.Lock()
+        # Writes not yet committed: key -> (expires_at, value), or None to delete
+        self._pending: Dict[str, Optional[Tuple[float, Any]]] = {}
+        self._clear_pending = False
+        self._wake = threading.Event()
+        self._closing = False
+        self._writer: Optional[threading.Thread] = None
+        # Per-entry size estimates, only tracked when there is a byte budget
+        self._sizes: Dict[str, int] = {}
+        self.bytes_used = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_writes = 0
+        self.disk_write_errors = 0
+        self.disk_purged = 0
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # Transactions are managed explicitly, one per batch of writes
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        # Drop anything that expired while the process was down
+        self._purge_expired()
+        self._writer = threading.Thread(target=self._write_loop, name=f"cache-writer-{self.name}", daemon=True)
+        self._writer.start()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Look up a key, checking memory first and then the disk tier.
+
+        A memory miss reads the disk tier on the calling thread; from async code, use aget.
+
+        Returns:
+            The cached value, or default if the key is missing or expired
+        """
+        resolved, value = self._get_memory(key)
+        if not resolved:
+            value = self._get_disk(key)
+        return default if value is _MISSING else value
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        """
+        Like get, but a memory miss reads the disk tier in a worker thread.
+
+        Returns:
+            The cached value, or default if the key is missing or expired
+        """
+        resolved, value = self._get_memory(key)
+        if not resolved:
+            value = await asyncio.to_thread(self._get_disk, key)
+        return default if value is _MISSING else value
+
+    def _get_memory(self, key: str) -> Tuple[bool, Any]:
+        """
+        Returns:
+            Tuple: (whether the disk tier can be skipped, the value or _MISSING)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                self._discard(key)
+
+            if key in self._pending:
+                # Evicted from memory before the writer committed it, or deleted
+                entry = self._pending[key]
+                if entry is not None and entry[0] > now:
+                    self._store(key, entry[1], entry[0])
+                    self.hits += 1
+                    return True, entry[1]
+            elif self._db is not None:
+                return False, _MISSING
+
+            self.misses += 1
+            return True, _MISSING
+
+    def _get_disk(self, key: str) -> Any:
+        with self._db_lock:
+            row = None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, value FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.name, key)
+                ).fetchone()
+        value = _MISSING
+        if row is not None and row[0] > time.time():
+            value = json.loads(row[1])
+            if self._decode is not None:
+                value = self._decode(value)
+
+        with self._lock:
+            if value is _MISSING or key in self._pending:
+                # Missing, expired, or changed while the row was being read
+                self.misses += 1
+                return _MISSING
+            self._store(key, value, row[0])
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value in memory and, when enabled, queue it for the disk tier.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Lifetime in seconds (defaults to the cache's TTL)
+        """
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                self._pending[key] = (expires_at, value)
+
+    def _store(self, key: str, value: Any, expires_at: float) -> None:
+        if self.max_bytes is not None:
+            size = estimate_size(value)
+            if size > self.max_bytes:
+                # Would evict everything else and still not fit
+                self._discard(key)
+                return
+            self.bytes_used += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.bytes_used > self.max_bytes):
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self.bytes_used -= self._sizes.pop(key, 0)
+
+
+    def _write_loop(self) -> None:
+        next_purge = time.monotonic() + self.purge_interval
+        while True:
+            self._wake.wait(self.flush_interval)
+            closing = self._closing
+            self._flush()
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + self.purge_interval
+                try:
+                    self._purge_expired()
+                except sqlite3.Error:
+                    logger.exception("Cache %s: failed to purge expired rows", self.name)
+            if closing:
+                return
+
+    def _flush(self) -> None:
+        """
+        Commit the queued writes in one transaction. Writes that fail are
+        logged, counted in disk_write_errors and dropped, not retried; the
+        entries stay in memory.
+        """
+        with self._lock:
+            pending = dict(self._pending)
+            clear, self._clear_pending = self._clear_pending, False
+        if not pending and not clear:
+            return
+
+        deletes = []
+        rows = []
+        errors = 0
+        for key, entry in pending.items():
+            if entry is None:
+                deletes.append((self.name, key))
+                continue
+            try:
+                value = self._encode(entry[1]) if self._encode is not None else entry[1]
+                rows.append((self.name, key, entry[0], json.dumps(value)))
+            except Exception:
+                logger.exception("Cache %s: could not serialize %s for the disk tier", self.name, key[:12])
+                errors += 1
+
+        written = 0
+        with self._db_lock:
+            if self._db is not None:
+                try:
+                    self._db.execute("BEGIN")
+                    try:
+                        if clear:
+                            self._db.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.name,))
+                        self._db.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", deletes)
+                        self._db.executemany(
+                            "INSERT OR REPLACE INTO cache_entries (namespace, key, expires_at, value) VALUES (?, ?, ?, ?)",
+                            rows
+                        )
+                        self._db.execute("COMMIT")
+                        written = len(rows)
+                    except BaseException:
+                        self._db.execute("ROLLBACK")
+                        raise
+                except sqlite3.Error:
+                    logger.exception("Cache %s: failed to write %d entries to the disk tier", self.name, len(rows) + len(deletes))
+                    errors += len(rows) + len(deletes)
+
+        with self._lock:
+            # Keep anything queued again while this batch was being written
+            for key, entry in pending.items():
+                if self._pending.get(key, _MISSING) is entry:
+                    del self._pending[key]
+            self.disk_writes += written
+            self.disk_write_errors += errors
+
+    def _purge_expired(self) -> None:
+        # Freed pages are reused by later writes, so the file stops growing
+        with self._db_lock:
+            if self._db is None:
+                return
+            cursor = self._db.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                (self.name, time.time())
+            )
+        self.disk_purged += max(cursor.rowcount, 0)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._discard(key)
+            if self._db is not None:
+                self._pending[key] = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.bytes_used = 0
+            if self._db is not None:
+                self._pending.clear()
+                self._clear_pending = True
+
+    def flush(self) -> None:
+        """
+        Commit queued disk writes now, on the calling thread.
+        """
+        if self._db is not None:
+            self._flush()
+
+    def close(self) -> None:
+        """
+        Commit queued disk writes and close the disk tier.
+        """
+        with self._lock:
+            if self._db is None:
+                return
+            self._closing = True
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        with self._db_lock:
+            self._db.close()
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and current size for monitoring.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes_used if self.max_bytes is not None else None,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "disk_backed": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "pending_writes": len(self._pending),
+            "disk_writes": self.disk_writes,
+            "disk_write_errors": self.disk_write_errors,
+            "disk_purged": self.disk_purged,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
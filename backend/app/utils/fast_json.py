@@ -0,0 +1,49 @@
+import re
+import json
+from typing import Any, List, Optional, Union
+
+import jiter
+
+_decoder = json.JSONDecoder()
+# ": [" after a key, with optional whitespace
+_ARRAY_START_RE = re.compile(r"\s*:\s*\[")
+
+def loads(content: Union[bytes, str]) -> Any:
+    """
+    Parse a whole JSON document with jiter (Rust), about twice as fast as json.loads.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return jiter.from_json(content)
+
+def decode_array_field(content: bytes, key: str) -> Optional[List[Any]]:
+    """
+    Decode only the array stored under a top-level key of a JSON object,
+    without materializing the rest of the document. SerpAPI responses carry
+    filters, pagination and metadata we never read next to the results.
+
+    The key is located textually: an occurrence inside a string value would
+    be escaped (\\"key\\"), so the first unescaped '"key": [' is the field
+    itself as long as no nested object uses the same key before it.
+
+    Args:
+        content: UTF-8 JSON document
+        key: Name of the array field
+
+    Returns:
+        The decoded list, or None if the field isn't there (or isn't an array)
+        and the caller should fall back to a full parse
+    """
+    text = content.decode("utf-8")
+    needle = f'"{key}"'
+    position = text.find(needle)
+    while position >= 0:
+        match = None if position > 0 and text[position - 1] == "\\" else _ARRAY_START_RE.match(text, position + len(needle))
+        if match is not None:
+            try:
+                value, _ = _decoder.raw_decode(text, match.end() - 1)
+            except ValueError:
+                return None
+            return value
+        position = text.find(needle, position + 1)
+    return None
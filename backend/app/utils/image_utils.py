@@ -1,35 +1,129 @@
 import os
-import uuid
-from fastapi import UploadFile
-import aiofiles
-from typing import Optional
+import base64
+import asyncio
+import logging
+from io import BytesIO
+from dataclasses import dataclass
+from functools import cached_property
+from typing import List
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app.utils.metrics import PAYLOAD_BYTES, record_fallback, track_stage
 
-# Create a temporary directory for uploaded images if it doesn't exist
-TEMP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "temp")
-os.makedirs(TEMP_DIR, exist_ok=True)
+logger = logging.getLogger(__name__)
 
-async def save_upload_file_temporarily(upload_file: UploadFile) -> Optional[str]:
+# Vision models downscale anything larger than this anyway (shortest side 768px, longest 2048px
+# for gpt-4o high detail), so sending more pixels only costs upload time
+VISION_MAX_SHORT_SIDE = int(os.getenv("VISION_MAX_SHORT_SIDE", "768"))
+VISION_MAX_LONG_SIDE = int(os.getenv("VISION_MAX_LONG_SIDE", "2048"))
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG").upper()
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+
+_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif"
+}
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """
+    An image encoded for upload to a vision model.
+    """
+    data: bytes
+    mime_type: str
+    original_size: int
+
+    @cached_property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('utf-8')}"
+
+def prepare_image_for_vision(image_bytes: bytes) -> PreparedImage:
     """
-    Save an uploaded file to a temporary location.
-    
+    Decode an uploaded image once, fix its EXIF orientation, downscale it to the
+    resolution the vision model actually uses and re-encode it compactly.
+
+    The original bytes are kept when they are already smaller and need no
+    rotation or resizing, or when Pillow can't decode them.
+
     Args:
-        upload_file: The uploaded file from FastAPI
-        
+        image_bytes: Raw uploaded image
+
     Returns:
-        str: Path to the saved temporary file or None if saving failed
+        PreparedImage: Encoded payload and its MIME type
     """
     try:
-        # Generate a unique filename to avoid collisions
-        file_extension = os.path.splitext(upload_file.filename)[1] if upload_file.filename else ".jpg"
-        temp_filename = f"{uuid.uuid4()}{file_extension}"
-        temp_path = os.path.join(TEMP_DIR, temp_filename)
-        
-        # Save the file
-        async with aiofiles.open(temp_path, 'wb') as out_file:
-            content = await upload_file.read()
-            await out_file.write(content)
-            
-        return temp_path
-    except Exception as e:
-        print(f"Error saving uploaded file: {str(e)}")
-        return None
+        with Image.open(BytesIO(image_bytes)) as original:
+            original_format = original.format
+            # EXIF orientation 1 means the pixels are already upright
+            transposed = original.getexif().get(0x0112, 1) != 1
+            image = ImageOps.exif_transpose(original) if transposed else original
+
+            width, height = image.size
+            scale = min(
+                1.0,
+                VISION_MAX_SHORT_SIDE / min(width, height),
+                VISION_MAX_LONG_SIDE / max(width, height)
+            )
+            resized = scale < 1.0
+            if resized:
+                image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+            # JPEG has no alpha channel; flatten transparent images onto white
+            if VISION_IMAGE_FORMAT == "JPEG" and image.mode != "RGB":
+                if image.mode in ("RGBA", "LA", "P"):
+                    image = image.convert("RGBA")
+                    background = Image.new("RGB", image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel("A"))
+                    image = background
+                else:
+                    image = image.convert("RGB")
+
+            buffer = BytesIO()
+            image.save(buffer, format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY, optimize=True)
+            encoded = buffer.getvalue()
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logger.warning("Could not preprocess image, sending original bytes: %s", e)
+        record_fallback("vision_original_image")
+        return PreparedImage(data=image_bytes, mime_type=guess_image_mime_type(image_bytes), original_size=len(image_bytes))
+
+    if not resized and not transposed and len(encoded) >= len(image_bytes) and original_format in _MIME_TYPES:
+        return PreparedImage(data=image_bytes, mime_type=_MIME_TYPES[original_format], original_size=len(image_bytes))
+
+    return PreparedImage(data=encoded, mime_type=_MIME_TYPES.get(VISION_IMAGE_FORMAT, "image/jpeg"), original_size=len(image_bytes))
+
+async def prepare_images_for_vision(images: List[bytes]) -> List[PreparedImage]:
+    """
+    Preprocess a batch of images on a worker thread so decoding and resizing
+    don't block the event loop.
+
+    Args:
+        images: Raw uploaded images
+
+    Returns:
+        List[PreparedImage]: Encoded payloads in the same order
+    """
+    if not images:
+        return []
+    with track_stage("image_preprocessing"):
+        prepared = await asyncio.to_thread(lambda: [prepare_image_for_vision(image) for image in images])
+    for image in prepared:
+        PAYLOAD_BYTES.observe(image.original_size, kind="upload_image")
+        PAYLOAD_BYTES.observe(len(image.data), kind="vision_image")
+    logger.debug(
+        "Prepared %d image(s) for vision upload: %d -> %d bytes",
+        len(prepared), sum(image.original_size for image in prepared), sum(len(image.data) for image in prepared)
+    )
+    return prepared
+
+def guess_image_mime_type(image_bytes: bytes) -> str:
+    """
+    Guess an image's MIME type from its magic bytes, defaulting to JPEG.
+    """
+    if image_bytes.startswith(b"\x89PNG"):
+        return "image/png"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bytes[:3] == b"GIF":
+        return "image/gif"
+    return "image/jpeg"
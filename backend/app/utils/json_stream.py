@@ -0,0 +1,84 @@
+import json
+from typing import Any, List, Optional
+
+class JsonArrayStream:
+    """
+    Incremental scanner that yields the elements of one top-level array in a
+    JSON document as soon as each element's closing brace arrives, e.g. the
+    "items" of a recommendation while the model is still generating the rest.
+
+    Each character is scanned once, tracking only nesting depth and string
+    state; the completed element's text is then decoded with json.loads.
+    Only object elements are reported.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._buffer = ""
+        self._position = 0
+        # Open containers, "{" or "["
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # Last string that ended directly inside the root object, i.e. a key or a value
+        self._last_root_string: Optional[str] = None
+        # Depth of the target array once found, and whether it has been closed
+        self._array_depth: Optional[int] = None
+        self._finished = False
+        self._element_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Add the next piece of the document.
+
+        Args:
+            chunk: Next characters of the JSON text
+
+        Returns:
+            List: Array elements completed by this chunk, decoded
+        """
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        stack = self._stack
+        for index in range(self._position, len(buffer)):
+            char = buffer[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(stack) == 1:
+                        self._last_root_string = buffer[self._string_start:index + 1]
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                if char == "[" and len(stack) == 1 and self._array_depth is None and self._is_target_key():
+                    self._array_depth = len(stack) + 1
+                stack.append(char)
+                if char == "{" and self._array_depth is not None and not self._finished and len(stack) == self._array_depth + 1:
+                    self._element_start = index
+            elif char in "}]":
+                if char == "}" and self._element_start is not None and len(stack) == self._array_depth + 1:
+                    completed.append(json.loads(buffer[self._element_start:index + 1]))
+                    self._element_start = None
+                if stack:
+                    stack.pop()
+                if char == "]" and self._array_depth is not None and len(stack) == self._array_depth - 1:
+                    self._finished = True
+        self._position = len(buffer)
+        return completed
+
+    def _is_target_key(self) -> bool:
+        # The array's key is the last root-level string before the "[" (only ":" and whitespace between)
+        if self._last_root_string is None:
+            return False
+        try:
+            return json.loads(self._last_root_string) == self.key
+        except ValueError:
+            return False
@@ -0,0 +1,40 @@
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+class LatencyTracker:
+    """
+    Sliding window of recent latencies (in seconds) with percentile lookups.
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Return the given percentile (0-100) of the window, or None when empty.
+        """
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """
+        Return p50/p95/p99 in milliseconds for monitoring.
+        """
+        summary = {"samples": len(self._samples)}
+        for percent in (50, 95, 99):
+            value = self.percentile(percent)
+            summary[f"p{percent}_ms"] = round(value * 1000, 1) if value is not None else None
+        return summary
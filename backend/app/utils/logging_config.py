@@ -0,0 +1,51 @@
+import os
+import json
+import logging
+from typing import Optional
+
+# LOG_LEVEL applies to the app's loggers; DEBUG turns on the per-query hot-path messages
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# text for local development, json for log shippers
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord has; anything else was passed through extra={...}
+_RESERVED_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with the standard fields plus any extra={...} fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None) -> None:
+    """
+    Set up the "app" logger hierarchy once at startup.
+
+    Args:
+        level: Log level name (defaults to LOG_LEVEL)
+        log_format: "text" or "json" (defaults to LOG_FORMAT)
+    """
+    handler = logging.StreamHandler()
+    if (log_format or LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    app_logger = logging.getLogger("app")
+    app_logger.handlers[:] = [handler]
+    app_logger.setLevel(level or LOG_LEVEL)
+    # Don't duplicate into uvicorn's root handlers
+    app_logger.propagate = False
@@ -0,0 +1,26 @@
+import time
+import asyncio
+import logging
+
+from app.utils.metrics import EVENT_LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+# Lag above this is logged, since every in-flight request stalled for that long
+SLOW_LOOP_WARNING_SECONDS = 0.25
+
+async def monitor_event_loop_lag(interval: float) -> None:
+    """
+    Sleep for a fixed interval in a loop and record how much later than
+    scheduled each wakeup happened in EVENT_LOOP_LAG. Runs until cancelled.
+
+    Args:
+        interval: Seconds between samples
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        if lag > SLOW_LOOP_WARNING_SECONDS:
+            logger.warning("Event loop was blocked for %.0f ms", lag * 1000)
@@ -0,0 +1,259 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds: 5 ms up to 2 minutes (image generation is slow)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Payload size buckets in bytes: 1 KB up to 16 MB
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(8))
+# Event loop lag buckets in seconds: 1 ms up to 1 second
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# (labels, value) pairs for one metric family
+Samples = List[Tuple[Dict[str, str], float]]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, one series per label combination.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram with sum and count, one series per label combination.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts with a final +Inf bucket, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        """
+        Observe the duration of the block in seconds, whether or not it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        lines = []
+        for key, counts, total in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together in the Prometheus text exposition format.
+
+    Besides counters and histograms updated inline, collectors are called at
+    scrape time to export values other components already track (cache and
+    scheduler statistics), so those don't need duplicate bookkeeping.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Samples]]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Samples]]]) -> None:
+        """
+        Add a scrape-time collector yielding (name, type, help, samples) families.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+STAGE_DURATION = metrics.histogram(
+    "fashion_stage_duration_seconds",
+    "Duration of recommendation pipeline stages and upstream calls",
+    ["stage"]
+)
+STAGE_ERRORS = metrics.counter(
+    "fashion_stage_errors_total",
+    "Stages that raised an error",
+    ["stage"]
+)
+UPSTREAM_REQUESTS = metrics.counter(
+    "fashion_upstream_requests_total",
+    "Requests sent to external APIs by outcome (HTTP status, ok or error)",
+    ["service", "outcome"]
+)
+FALLBACKS = metrics.counter(
+    "fashion_fallbacks_total",
+    "Degraded paths taken instead of the primary one",
+    ["kind"]
+)
+PAYLOAD_BYTES = metrics.histogram(
+    "fashion_payload_bytes",
+    "Size of uploads, upstream payloads and generated images",
+    ["kind"],
+    buckets=SIZE_BUCKETS
+)
+OPENAI_TOKENS = metrics.counter(
+    "fashion_openai_tokens_total",
+    "OpenAI tokens used by model and direction",
+    ["model", "kind"]
+)
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "fashion_http_request_duration_seconds",
+    "API request latency by route and status",
+    ["method", "route", "status"]
+)
+EVENT_LOOP_LAG = metrics.histogram(
+    "fashion_event_loop_lag_seconds",
+    "How late the event loop ran a periodic timer, i.e. time spent blocked by synchronous work",
+    buckets=LAG_BUCKETS
+)
+
+# Fallback kinds taken during the current track_fallbacks block; tasks started
+# inside it copy the context and so append to the same list
+_fallbacks_taken: ContextVar[Optional[List[str]]] = ContextVar("fallbacks_taken", default=None)
+
+def record_fallback(kind: str, amount: int = 1) -> None:
+    """
+    Count a degraded path in FALLBACKS and note it for the enclosing track_fallbacks block.
+
+    Args:
+        kind: Fallback label, e.g. "default_recommendations"
+        amount: Number of fallbacks taken
+    """
+    FALLBACKS.inc(amount, kind=kind)
+    taken = _fallbacks_taken.get()
+    if taken is not None:
+        taken.append(kind)
+
+@contextmanager
+def track_fallbacks():
+    """
+    Collect the kinds of fallback taken inside the block, including in tasks
+    it starts, e.g. to avoid caching a degraded result.
+
+    Yields:
+        List[str]: Fallback kinds, filled in as they happen
+    """
+    taken: List[str] = []
+    token = _fallbacks_taken.set(taken)
+    try:
+        yield taken
+    finally:
+        _fallbacks_taken.reset(token)
+
+@contextmanager
+def track_stage(stage: str):
+    """
+    Time a pipeline stage into STAGE_DURATION and count failures in STAGE_ERRORS.
+    Cancellation (e.g. a client disconnecting) is timed but not counted as an error.
+
+    Args:
+        stage: Stage label, e.g. "vision_analysis" or "image_generation"
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=stage)
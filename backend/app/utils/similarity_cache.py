@@ -0,0 +1,200 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"a", "an", "and", "the", "for", "with", "in", "of", "by", "to", "on", "or", "fashion", "clothing"}
+
+# Universal hashing modulo a Mersenne prime; 32-bit inputs keep a * x + b inside uint64
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+def query_shingles(text: str) -> FrozenSet[str]:
+    """
+    Reduce a query to its set of word shingles: lowercased alphanumeric tokens
+    with stopwords dropped and plurals folded, so word order, punctuation and
+    hyphenation ("cable-knit" / "cable knit") don't matter.
+    """
+    shingles = set()
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        shingles.add(token)
+    return frozenset(shingles)
+
+def _shingle_hash(shingle: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class SimilarQueryCache:
+    """
+    Cache keyed by near-duplicate text rather than exact strings.
+
+    Queries are reduced to word shingles and a MinHash signature; LSH banding
+    finds candidate entries whose estimated Jaccard similarity is likely above
+    the threshold, and candidates are confirmed with the exact Jaccard of their
+    shingle sets. Entries expire after a TTL and the least recently used are
+    evicted past max_entries.
+
+    Short queries that differ in a single word can pass the threshold while
+    asking for a different product ("black wool trousers" / "black wool
+    blazer"), so each entry has a scope, e.g. the garment: only entries with
+    the same scope are considered similar.
+    """
+
+    def __init__(self, name: str, threshold: float = 0.6, max_entries: int = 2048, ttl: float = 3600.0, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        # Fixed seed so signatures are comparable across restarts
+        generator = np.random.default_rng(1)
+        self._a = generator.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = generator.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+        # (scope, shingle set) -> (expires_at, LSH band keys, value), least recently used first
+        self._entries: "OrderedDict[Tuple[str, FrozenSet[str]], Tuple[float, List[bytes], Any]]" = OrderedDict()
+        self._buckets: Dict[bytes, Set[Tuple[str, FrozenSet[str]]]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _band_keys(self, shingles: FrozenSet[str], scope: str) -> List[bytes]:
+        hashes = np.array([_shingle_hash(shingle) for shingle in shingles], dtype=np.uint64)
+        # One row per permutation, min over shingles
+        signature = ((np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+        # Buckets are per scope, so other scopes never become candidates
+        prefix = _shingle_hash(scope).to_bytes(4, "little")
+        return [
+            bytes([index]) + prefix + band.tobytes()
+            for index, band in enumerate(signature.reshape(self.bands, self.rows))
+        ]
+
+    def get(self, text: str, default: Any = None, scope: str = "", similar: bool = True) -> Any:
+        """
+        Return the value cached for the most similar stored query, if it is similar enough.
+
+        Args:
+            text: Query text
+            default: Returned on a miss
+            scope: Only entries stored with the same scope can match
+            similar: False to accept only an entry with the same shingles
+
+        Returns:
+            The cached value, or default
+        """
+        shingles = query_shingles(text)
+        if not shingles:
+            self.misses += 1
+            return default
+        key = (scope, shingles)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.exact_hits += 1
+                return entry[2]
+            if not similar:
+                self.misses += 1
+                return default
+
+            candidates = set()
+            for band_key in self._band_keys(shingles, scope):
+                candidates.update(self._buckets.get(band_key, ()))
+
+            best, best_score = None, self.threshold
+            for candidate in candidates:
+                if candidate[0] != scope or self._entries[candidate][0] <= now:
+                    continue
+                score = jaccard(shingles, candidate[1])
+                if score >= best_score:
+                    best, best_score = candidate, score
+            if best is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best][2]
+
+    def set(self, text: str, value: Any, ttl: Optional[float] = None, scope: str = "") -> None:
+        """
+        Store a value under the query's shingle set.
+
+        Args:
+            text: Query text
+            value: Value to store
+            ttl: Lifetime in seconds (defaults to the cache's TTL)
+            scope: Scope the entry can be matched in (see get)
+        """
+        shingles = query_shingles(text)
+        if not shingles:
+            return
+        key = (scope, shingles)
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            band_keys = self._band_keys(shingles, scope)
+            self._entries[key] = (expires_at, band_keys, value)
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Tuple[str, FrozenSet[str]]) -> None:
+        _, band_keys, _ = self._entries.pop(key)
+        for band_key in band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and current size for monitoring.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.hits - self.exact_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key starts the work; callers that arrive while it
+    is still running await the same result (or exception) instead of issuing
+    duplicate upstream calls.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func() for key unless an identical call is already in flight.
+
+        Args:
+            key: Normalized identity of the request
+            func: Zero-argument callable returning the awaitable to run
+
+        Returns:
+            The shared result
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield so one caller going away doesn't cancel the work for everyone else
+        return await asyncio.shield(task)
+
+    def get(self, key: str) -> Optional[asyncio.Task]:
+        """
+        Return the in-flight task for key, if any.
+        """
+        return self._in_flight.get(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,93 @@
+"""
+Benchmark for the shopping query canonicalizer.
+
+Uses a hand-written corpus of item descriptions in the style model's voice:
+each group is one product phrased several ways, written independently of the
+canonicalizer's vocabulary (brands, patterns, filler and trailing clauses
+included). Reports canonicalization throughput, the upstream searches needed
+for the corpus with raw versus canonical queries, paraphrase groups that
+didn't collapse to one key, and distinct products that wrongly share a key
+(each of those serves the wrong results from cache).
+
+Usage (from backend/):
+    python -m benchmarks.bench_canonicalize [--rounds 1000]
+"""
+import argparse
+import time
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+from app.services.query_canonicalizer import canonicalize_query
+from app.services.serpapi_client import shopping_cache_key
+
+# One product per group; groups that differ only in garment or color must not share a key
+PARAPHRASES: List[List[str]] = [
+    ["Cream cable-knit oversized sweater", "An oversized cream cable knit sweater, perfect for layering",
+     "Oversized cable-knit sweater in cream"],
+    ["Slim black wool trousers", "Black slim-fit wool trousers for a polished look", "Slim fit trousers in black wool"],
+    ["Slim black wool blazer", "A tailored-looking slim black wool blazer", "Slim-fit black wool blazer, ideal for the office"],
+    ["Slim navy wool trousers", "Navy slim fit wool trousers", "Slim wool trousers in navy"],
+    ["White leather sneakers", "Classic white leather sneakers, perfect for everyday wear", "Minimalist white leather sneakers"],
+    ["Nike Air Force 1 sneakers", "Classic Nike Air Force 1 sneakers", "Nike Air Force 1 sneakers for a sporty touch"],
+    ["Levi 501 jeans", "Classic Levi 501 jeans", "Levi 501 jeans with a straight cut"],
+    ["Floral print wrap dress", "A floral print wrap dress perfect for summer", "Flowy floral print wrap dress"],
+    ["Lavender midi dress", "A flowy lavender midi dress perfect for brunch", "Lavender midi dress with a cinched waist"],
+    ["Short sleeve white linen shirt", "A short sleeve white linen shirt for warm days", "White linen short sleeve shirt"],
+    ["Flat ankle boots in tan suede", "Tan suede flat ankle boots", "Flat ankle boots in tan suede, great for fall"],
+    ["Black leather top-handle bag with gold hardware", "Structured black leather top-handle bag",
+     "Black leather top handle bag that elevates any outfit"],
+    ["Low heel black leather mules", "Black leather low heel mules", "Elegant low heel black leather mules"],
+    ["High-waisted denim shorts", "High waisted denim shorts for summer", "Denim high-waisted shorts"],
+    ["Camel wool coat", "A timeless camel wool coat", "Camel wool coat, perfect for layering over knits"],
+    ["Gold hoop earrings", "Gold hoop earrings", "Gold hoop earrings to finish the look"],
+    ["Striped breton top", "Classic striped breton top", "Breton striped top"],
+    ["Black tank top with lace trim", "Black tank top", "Fitted black tank top"],
+]
+
+def key_quality() -> Tuple[List[int], List[Tuple[int, int]]]:
+    """
+    Find groups whose paraphrases got more than one key, and pairs of distinct groups that share a key.
+    """
+    groups_by_key: Dict[str, Set[int]] = defaultdict(set)
+    split = []
+    for group, descriptions in enumerate(PARAPHRASES):
+        keys = {canonicalize_query(description).key for description in descriptions}
+        if len(keys) > 1:
+            split.append(group)
+        for key in keys:
+            groups_by_key[key].add(group)
+    merged = sorted({tuple(sorted(groups))[:2] for groups in groups_by_key.values() if len(groups) > 1})
+    return split, merged
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=1000, help="passes over the corpus when timing")
+    args = parser.parse_args()
+
+    descriptions = [description for group in PARAPHRASES for description in group]
+
+    uncached = canonicalize_query.__wrapped__
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for description in descriptions:
+            uncached(description)
+    uncached_rate = args.rounds * len(descriptions) / (time.perf_counter() - started)
+
+    raw_distinct = len({shopping_cache_key("", {"q": description}) for description in descriptions})
+    canonical_distinct = len({canonicalize_query(description).key for description in descriptions})
+    split, merged = key_quality()
+
+    print(f"canonicalize (uncached):         {uncached_rate:>10,.0f} queries/s")
+    print(f"products in the corpus:          {len(PARAPHRASES):>10}")
+    print(f"upstream searches, raw queries:  {raw_distinct:>10}")
+    print(f"upstream searches, canonical:    {canonical_distinct:>10}")
+    print(f"groups split over several keys:  {len(split):>10}")
+    for group in split:
+        for description in PARAPHRASES[group]:
+            print(f"  {description!r} -> {canonicalize_query(description).text!r}")
+    print(f"distinct products sharing a key: {len(merged):>10}")
+    for first, second in merged:
+        print(f"  {PARAPHRASES[first][0]!r} ~ {PARAPHRASES[second][0]!r}")
+
+if __name__ == "__main__":
+    main()
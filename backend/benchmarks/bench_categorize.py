@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for categorize_item.
+
+Compares the precompiled keyword matcher in serpapi_service against the
+original per-keyword re.search implementation on a synthetic catalog, checks
+that both return the same category for every item, and prints items/second.
+
+Usage (from backend/):
+    python -m benchmarks.bench_categorize [--items 100000] [--seed 42]
+"""
+import argparse
+import random
+import re
+import time
+from typing import List
+
+from app.services.product_result import ProductResult
+from app.services.serpapi_service import CLOTHING_CATEGORIES, categorize_item
+
+FILLER_WORDS = [
+    "women's", "men's", "unisex", "classic", "vintage", "oversized", "slim", "fit", "cotton", "linen",
+    "wool", "cashmere", "leather", "denim", "black", "white", "cream", "navy", "olive", "striped",
+    "floral", "cropped", "high-waisted", "relaxed", "organic", "premium", "summer", "winter", "new",
+    "sale", "-", "|", "&", "2-pack", "size", "xl", "minimalist", "topshop", "shirtdress", "bootcut",
+    "hatband", "capes", "vested", "tanktop", "sweatshirts", "shoestring", "bags", "watches"
+]
+QUERY_TEMPLATES = [
+    "stylish {}", "{} for women", "cream {} outfit", "fashion {}", "casual {} look", "{}"
+]
+
+def legacy_categorize_item(item: ProductResult) -> str:
+    """
+    The original implementation, kept here as the reference for equivalence checks.
+    """
+    title = item.title.lower()
+    search_query = item.search_query.lower()
+    text_to_check = title + " " + search_query
+    for category, keywords in CLOTHING_CATEGORIES.items():
+        for keyword in keywords:
+            pattern = r'\b' + re.escape(keyword) + r'\b'
+            if re.search(pattern, text_to_check):
+                return category
+    for category, keywords in CLOTHING_CATEGORIES.items():
+        for keyword in keywords:
+            if keyword in search_query:
+                return category
+    return "tops"
+
+def build_catalog(count: int, seed: int) -> List[ProductResult]:
+    """
+    Build synthetic shopping results with realistic title and query shapes.
+    """
+    rng = random.Random(seed)
+    keywords = [keyword for keywords in CLOTHING_CATEGORIES.values() for keyword in keywords]
+    catalog = []
+    for _ in range(count):
+        words = rng.sample(FILLER_WORDS, rng.randint(3, 8))
+        # Most titles name a garment; some name two or none
+        for _ in range(rng.choice([0, 1, 1, 1, 2])):
+            keyword = rng.choice(keywords)
+            words.insert(rng.randrange(len(words) + 1), keyword.upper() if rng.random() < 0.1 else keyword)
+        query_keyword = rng.choice(keywords + FILLER_WORDS)
+        catalog.append(ProductResult(
+            title=" ".join(words).title() if rng.random() < 0.3 else " ".join(words),
+            link="",
+            search_query=rng.choice(QUERY_TEMPLATES).format(query_keyword)
+        ))
+    return catalog
+
+def measure(func, catalog: List[ProductResult]) -> float:
+    started = time.perf_counter()
+    for item in catalog:
+        func(item)
+    return len(catalog) / (time.perf_counter() - started)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.items, args.seed)
+
+    mismatches = [item for item in catalog if categorize_item(item) != legacy_categorize_item(item)]
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} items categorized differently, e.g. {mismatches[0]}")
+    print(f"Equivalence check passed on {len(catalog)} items")
+
+    legacy_rate = measure(legacy_categorize_item, catalog)
+    current_rate = measure(categorize_item, catalog)
+    print(f"legacy re.search per keyword: {legacy_rate:>12,.0f} items/s")
+    print(f"precompiled matcher:          {current_rate:>12,.0f} items/s")
+    print(f"speedup:                      {current_rate / legacy_rate:>12.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Import-time budget for the backend.
+
+Imports the app (default: main) in fresh interpreters with -X importtime,
+reports the median import time, the slowest top-level imports, and whether
+the heavy SDKs that should load lazily were imported. Exits non-zero when
+the median exceeds --budget-ms, so it can gate CI.
+
+Equivalent one-off check:
+    python -X importtime -c "import main" 2> importtime.log
+
+Usage (from backend/):
+    python -m benchmarks.bench_import [--module main] [--runs 5] [--top 12] [--budget-ms 1000]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Should only be imported when a request (or the lifespan preload) first needs them
+LAZY_MODULES = ("openai", "huggingface_hub")
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def import_profile(module: str) -> Tuple[int, Dict[str, int], List[str]]:
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        Tuple: (cumulative microseconds for the module, cumulative microseconds
+        of each top-level import below it, every module imported)
+    """
+    # Keys removed on purpose: importing must not require credentials
+    env = {key: value for key, value in os.environ.items() if not key.endswith("_API_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    # (cumulative, indent, name) in completion order: children are listed before their parent
+    lines = [(int(match.group(2)), len(match.group(3)), match.group(4)) for match in _LINE_RE.finditer(result.stderr)]
+    imported = [name for _, _, name in lines]
+    root = next(index for index, (_, _, name) in enumerate(lines) if name == module)
+    total, root_indent, _ = lines[root]
+
+    # Direct imports of the module are the costs worth attacking first
+    top_level: Dict[str, int] = {}
+    for cumulative, indent, name in reversed(lines[:root]):
+        if indent <= root_indent:
+            break
+        if indent == root_indent + 2:
+            top_level[name] = cumulative
+    return total, top_level, imported
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12, help="slowest top-level imports to list")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="fail when the median import exceeds this")
+    args = parser.parse_args()
+
+    totals = []
+    top_level: Dict[str, List[int]] = {}
+    imported: List[str] = []
+    for _ in range(args.runs):
+        total, children, imported = import_profile(args.module)
+        totals.append(total)
+        for name, micros in children.items():
+            top_level.setdefault(name, []).append(micros)
+
+    median_ms = statistics.median(totals) / 1000
+    print(f"import {args.module}: median {median_ms:.0f} ms, min {min(totals) / 1000:.0f} ms over {args.runs} runs")
+    print("slowest top-level imports (median ms):")
+    ranked = sorted(((statistics.median(values) / 1000, name) for name, values in top_level.items()), reverse=True)
+    for millis, name in ranked[:args.top]:
+        print(f"  {millis:>8.1f}  {name}")
+
+    loaded = [name for name in LAZY_MODULES if name in imported]
+    print(f"lazy SDKs imported eagerly: {', '.join(loaded) if loaded else 'none'}")
+
+    if median_ms > args.budget_ms:
+        print(f"FAIL: median import time {median_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"OK: within the {args.budget_ms:.0f} ms budget")
+
+if __name__ == "__main__":
+    main()
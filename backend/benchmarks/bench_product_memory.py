@@ -0,0 +1,171 @@
+"""
+Memory benchmark for shopping result parsing.
+
+Compares the original search path (json.loads of the whole SerpAPI
+response, raw results cached, a fresh dict per result) against the current
+one (decode only the shopping_results array, cache slotted ProductResult
+objects, copy the returned ones) on synthetic responses shaped like real
+ones: the results plus filters, pagination and metadata that are never read.
+
+For each path it reports, measured with tracemalloc:
+- peak bytes allocated while handling one response
+- bytes still held per response by the cache entry and the returned results
+and the throughput without tracing (best of interleaved rounds).
+
+Usage (from backend/):
+    python -m benchmarks.bench_product_memory [--results 40] [--num-results 5] [--responses 200] [--rounds 7]
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.services.product_result import normalize_shopping_result
+from app.utils.fast_json import decode_array_field
+from benchmarks.fake_upstreams import shopping_results
+
+FILTER_NAMES = ["Price", "Color", "Size", "Brand", "Material", "Department", "Condition", "Seller"]
+
+def build_response(query: str, count: int, rng: random.Random) -> bytes:
+    """
+    Build a SerpAPI-like shopping response as UTF-8 JSON.
+    """
+    document = {
+        "search_metadata": {"id": f"{rng.getrandbits(64):x}", "status": "Success", "total_time_taken": 1.42},
+        "search_parameters": {"engine": "google", "q": query, "tbm": "shop", "gl": "us", "hl": "en"},
+        "search_information": {"shopping_results_state": "Results for exact spelling"},
+        "filters": [
+            {
+                "type": name,
+                "options": [
+                    {"text": f"{name} option {index}", "tbs": f"mr:1,{name.lower()}:{rng.getrandbits(32)}"}
+                    for index in range(12)
+                ]
+            }
+            for name in FILTER_NAMES
+        ],
+        "shopping_results": shopping_results(query, count, rng),
+        "related_searches": [{"query": f"{query} {index}", "link": f"https://www.google.com/search?q={index}"} for index in range(8)],
+        "serpapi_pagination": {"current": 1, "next": "https://serpapi.com/search.json?start=40"}
+    }
+    return json.dumps(document).encode("utf-8")
+
+def legacy_search(content: bytes, search_query: str, num_results: int) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """
+    The original path: parse everything, cache the raw results, then build one
+    dict per result and return the first num_results.
+
+    Returns:
+        Tuple: (what the shopping cache holds, what the caller gets)
+    """
+    response_text = content.decode("utf-8")
+    data = json.loads(response_text)
+    shopping_results = data.get("shopping_results", [])
+    recommendations = []
+    for item in shopping_results:
+        product_link = item.get("link", "") or item.get("product_link", "")
+        if product_link and not (product_link.startswith("http://") or product_link.startswith("https://")):
+            product_link = "https://" + product_link
+        if product_link:
+            product_link = product_link.strip().replace(" ", "%20")
+        recommendations.append({
+            "title": item.get("title", ""),
+            "link": product_link,
+            "source": item.get("source", ""),
+            "price": item.get("price", ""),
+            "thumbnail": item.get("thumbnail", ""),
+            "rating": item.get("rating", None),
+            "reviews": item.get("reviews", None),
+            "extensions": item.get("extensions", []),
+            "search_query": search_query
+        })
+    return shopping_results, recommendations[:num_results]
+
+def current_search(content: bytes, search_query: str, num_results: int) -> Tuple[List[Any], List[Any]]:
+    """
+    The current path, as in serpapi_client and serpapi_service.search_single_query.
+
+    Returns:
+        Tuple: (what the shopping cache holds, what the caller gets)
+    """
+    products = [normalize_shopping_result(item) for item in decode_array_field(content, "shopping_results")]
+    return products, [product.with_query(search_query) for product in products[:num_results]]
+
+def measure_memory(search: Callable[..., Tuple[List[Any], List[Any]]], responses: List[bytes], num_results: int) -> Dict[str, float]:
+    """
+    Peak bytes per search, and bytes retained per response by the cache entry
+    plus the returned results.
+    """
+    gc.collect()
+    peaks = []
+    kept = []
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for content in responses:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        kept.append(search(content, "query", num_results))
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    results = sum(len(cached) for cached, _ in kept)
+    return {
+        "peak": sum(peaks) / len(peaks),
+        "retained": retained / len(responses),
+        "per_result": retained / results if results else 0.0
+    }
+
+def measure_throughput(searches: Dict[str, Callable[..., Any]], responses: List[bytes], num_results: int, rounds: int) -> Dict[str, float]:
+    """
+    Responses per second for each path: the best of several interleaved rounds,
+    so a noisy machine affects both paths alike.
+    """
+    best = {name: 0.0 for name in searches}
+    for _ in range(rounds):
+        for name, search in searches.items():
+            gc.collect()
+            started = time.perf_counter()
+            for content in responses:
+                search(content, "query", num_results)
+            best[name] = max(best[name], len(responses) / (time.perf_counter() - started))
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=40, help="shopping results per response")
+    parser.add_argument("--num-results", type=int, default=5, help="results returned to the caller, as search_single_query")
+    parser.add_argument("--responses", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=7, help="interleaved timing rounds")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = ["linen shirt", "wide leg trousers", "leather ankle boots", "wrap dress", "wool coat"]
+    responses = [build_response(rng.choice(queries), args.results, rng) for _ in range(args.responses)]
+    average_size = sum(len(content) for content in responses) / len(responses)
+    print(f"{len(responses)} responses, {args.results} results each, {average_size / 1024:.1f} KiB average")
+
+    # Both paths must return the same results
+    for content in responses[:20]:
+        _, expected = legacy_search(content, "query", args.num_results)
+        _, actual = current_search(content, "query", args.num_results)
+        for old, new in zip(expected, (product.to_dict() for product in actual)):
+            if any(old[key] != (list(new[key]) if key == "extensions" else new[key]) for key in old):
+                raise SystemExit(f"Results differ: {old} != {new}")
+
+    searches = {"json.loads + dicts": legacy_search, "array slice + slots": current_search}
+    rates = measure_throughput(searches, responses, args.num_results, args.rounds)
+    print(f"{'':<22}{'peak/search':>14}{'retained/resp':>16}{'per result':>13}{'responses/s':>14}")
+    for name, search in searches.items():
+        memory = measure_memory(search, responses, args.num_results)
+        print(
+            f"{name:<22}{memory['peak'] / 1024:>11.1f} KiB{memory['retained'] / 1024:>13.1f} KiB"
+            f"{memory['per_result']:>11.0f} B{rates[name]:>14,.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Local stand-ins for the OpenAI, SerpAPI and HuggingFace APIs.
+
+Serves just enough of each API for the backend to run its full pipeline
+without spending quota:
+
+    POST /v1/chat/completions   OpenAI chat and structured-output (parse) calls, streamed or not
+    GET  /search                SerpAPI Google Shopping results
+    POST /flux                  HuggingFace text-to-image (returns a PNG)
+
+Each service sleeps for a log-normally distributed latency (median and
+spread configurable) and fails a configurable fraction of requests. Streamed
+completions send their first token after a quarter of the sampled latency and
+spread the rest of it over the chunks, like a model decoding. Responses
+are derived from a hash of the request, so identical inputs get identical
+outputs and the backend's caches behave as they would against the real APIs.
+
+Point the backend at it with:
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    SERPAPI_BASE_URL=http://127.0.0.1:9100/search
+    HF_INFERENCE_BASE_URL=http://127.0.0.1:9100/flux
+
+Usage (from backend/):
+    python -m benchmarks.fake_upstreams [--port 9100] [--openai-latency 2500:0.35]
+        [--serpapi-latency 900:0.5] [--flux-latency 6000:0.25] [--openai-error-rate 0.0]
+        [--serpapi-error-rate 0.0] [--flux-error-rate 0.0] [--error-status 500]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from PIL import Image
+
+CATEGORIES = {
+    "Tops": ["sweater", "shirt", "blouse", "t-shirt", "cardigan", "turtleneck"],
+    "Bottoms": ["trousers", "jeans", "skirt", "shorts", "chinos"],
+    "Dresses": ["midi dress", "slip dress", "shirt dress", "maxi dress"],
+    "Outerwear": ["coat", "blazer", "trench coat", "denim jacket", "puffer jacket"],
+    "Shoes": ["loafers", "ankle boots", "sneakers", "sandals", "ballet flats"],
+    "Accessories": ["tote bag", "belt", "scarf", "gold hoop earrings", "sunglasses"]
+}
+FITS = ["oversized", "relaxed", "tailored", "cropped", "high-waisted", "wide-leg", "slim-fit", ""]
+COLORS = ["cream", "black", "navy", "olive", "white", "charcoal", "camel", "sage green", "burgundy", "blush pink"]
+MATERIALS = ["wool", "linen", "cotton", "denim", "leather", "cashmere", "cable-knit", "silk", "suede", ""]
+CLOSERS = ["", ", perfect for layering", " for a polished everyday look", " in a versatile cut", " to elevate the outfit"]
+STYLE_NAMES = ["Quiet Luxury", "Coastal Casual", "Modern Minimalist", "Parisian Chic", "Soft Grunge", "Smart Casual"]
+STORES = ["Everlane", "Uniqlo", "COS", "Madewell", "J.Crew", "Zara", "Nordstrom", "Amazon.com", "eBay", "Etsy"]
+TITLE_EXTRAS = ["Women's", "Men's", "Unisex", "Classic", "New", "Organic", "Premium", "Relaxed Fit", "2024"]
+
+# Streamed completions: share of the latency before the first token, and characters per chunk (about 3 tokens)
+FIRST_TOKEN_FRACTION = 0.25
+STREAM_CHUNK_CHARS = 12
+
+@dataclass
+class UpstreamProfile:
+    """
+    Latency distribution and failure rate of one fake service.
+    """
+    median_ms: float
+    sigma: float
+    error_rate: float = 0.0
+
+    def sample_delay(self, rng: random.Random) -> float:
+        # Log-normal: most calls near the median, with a long tail like real APIs
+        return self.median_ms / 1000 * math.exp(self.sigma * rng.gauss(0.0, 1.0))
+
+def parse_latency(spec: str) -> UpstreamProfile:
+    """
+    Parse "<median ms>[:<sigma>]", e.g. "900:0.5".
+    """
+    median, _, sigma = spec.partition(":")
+    return UpstreamProfile(median_ms=float(median), sigma=float(sigma or 0.0))
+
+def request_rng(*parts: Any) -> random.Random:
+    # Same request, same response
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "little"))
+
+def style_response(rng: random.Random, with_attributes: bool) -> Dict[str, Any]:
+    items = []
+    for category, garments in CATEGORIES.items():
+        for _ in range(rng.choice((1, 1, 2))):
+            words = [rng.choice(FITS), rng.choice(COLORS), rng.choice(MATERIALS), rng.choice(garments)]
+            description = " ".join(word for word in words if word) + rng.choice(CLOSERS)
+            items.append({"description": description[0].upper() + description[1:], "category": category})
+    title = rng.choice(STYLE_NAMES)
+    response = {
+        "style": {
+            "title": title,
+            "description": f"A {title.lower()} wardrobe built around {rng.choice(COLORS)} and {rng.choice(COLORS)} tones.",
+            "tags": rng.sample(["minimal", "casual", "elegant", "layered", "neutral", "timeless", "relaxed", "polished"], 4)
+        },
+        "items": items
+    }
+    if with_attributes:
+        response["user_attributes"] = user_attributes(rng)
+    return response
+
+def user_attributes(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "gender_presentation": rng.choice(["feminine", "masculine", "androgynous"]),
+        "apparent_age_range": rng.choice(["18-25", "25-35", "35-45"]),
+        "body_type": rng.choice(["slim", "athletic", "curvy", "average"]),
+        "height_impression": rng.choice(["petite", "average", "tall"]),
+        "skin_tone": rng.choice(["fair", "medium", "olive", "deep"]),
+        "style_suggestions": rng.sample(["tailored blazers", "high-waisted trousers", "wrap dresses", "straight-leg jeans"], 2),
+        "colors_to_complement": rng.sample(COLORS, 3),
+        "avoid_styles": rng.sample(["boxy cuts", "busy prints", "very low rises"], 1)
+    }
+
+def shopping_results(query: str, count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    words = query.split()
+    slug = "-".join(words).lower()[:60] or "item"
+    results = []
+    for position in range(1, count + 1):
+        store = rng.choice(STORES)
+        price = round(rng.uniform(12, 320), 2)
+        title = " ".join([rng.choice(TITLE_EXTRAS), *words, rng.choice(["", "- Size M", "| Free Shipping", "Regular Fit"])]).strip()
+        results.append({
+            "position": position,
+            "title": title,
+            # Some results only have a product_link, like real shopping results
+            "link": f"https://{store.lower().replace(' ', '')}.example.com/p/{slug}-{position}" if rng.random() < 0.8 else "",
+            "product_link": f"https://www.google.com/shopping/product/{rng.getrandbits(48)}",
+            "source": store,
+            "price": f"${price:.2f}",
+            "extracted_price": price,
+            "thumbnail": f"https://images.example.com/{slug}-{position}.jpg",
+            "rating": round(rng.uniform(3.2, 5.0), 1) if rng.random() < 0.7 else None,
+            "reviews": rng.randint(3, 4000) if rng.random() < 0.7 else None,
+            "extensions": rng.sample(["Free delivery", "Sale", "Free returns", "Low price"], 1)
+        })
+    return results
+
+def render_png(size: int) -> bytes:
+    # Upscaled colour noise: smooth regions with some detail, so the backend's re-encoding costs about what a photo would
+    channels = [Image.effect_noise((max(1, size // 32),) * 2, 64).resize((size, size), Image.BICUBIC) for _ in range(3)]
+    image = Image.merge("RGB", channels)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            # About 4 characters per token; a detail=auto image costs 765
+            tokens += 765 if part.get("type") == "image_url" else len(part.get("text", "")) // 4
+    return tokens
+
+def create_app(profiles: Dict[str, UpstreamProfile], error_status: int = 500, image_size: int = 1024, seed: int = 0) -> FastAPI:
+    """
+    Build the fake upstream application.
+
+    Args:
+        profiles: UpstreamProfile for "openai", "serpapi" and "flux"
+        error_status: HTTP status returned for injected failures
+        image_size: Edge length of the generated image in pixels
+        seed: Seed for latency and failure sampling
+
+    Returns:
+        FastAPI: The application
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    image_bytes = render_png(image_size)
+    counts = {name: {"requests": 0, "errors": 0} for name in profiles}
+
+    def sample(service: str):
+        # (latency, whether this call fails)
+        profile = profiles[service]
+        counts[service]["requests"] += 1
+        failed = rng.random() < profile.error_rate
+        if failed:
+            counts[service]["errors"] += 1
+        return profile.sample_delay(rng), failed
+
+    def failure_response(service: str) -> JSONResponse:
+        return JSONResponse(status_code=error_status, content={"error": {"message": f"Injected {service} failure", "type": "server_error"}})
+
+    async def simulate(service: str):
+        # Sleep for a sampled latency, then return an error response if this call should fail
+        delay, failed = sample(service)
+        await asyncio.sleep(delay)
+        return failure_response(service) if failed else None
+
+    async def stream_chunks(text: str, completion: Dict[str, Any], usage: Dict[str, int], decode_seconds: float, include_usage: bool):
+        pieces = [text[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(text), STREAM_CHUNK_CHARS)]
+        chunk = {key: completion[key] for key in ("id", "created", "model")}
+        chunk["object"] = "chat.completion.chunk"
+        for index, piece in enumerate(pieces):
+            delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+            yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+            await asyncio.sleep(decode_seconds / len(pieces))
+        yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+        if include_usage:
+            yield f"data: {json.dumps({**chunk, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        delay, failed = sample("openai")
+        streamed = bool(body.get("stream"))
+        await asyncio.sleep(delay * FIRST_TOKEN_FRACTION if streamed else delay)
+        if failed:
+            return failure_response("openai")
+
+        messages = body.get("messages", [])
+        rng_for_request = request_rng(messages)
+        schema_name = body.get("response_format", {}).get("json_schema", {}).get("name", "")
+        if schema_name and schema_name != "UserAttributes":
+            # A recommendations payload, with attributes for the single-pass schema
+            content = style_response(rng_for_request, with_attributes="SinglePass" in schema_name)
+        else:
+            # Photo analysis, structured or as JSON in free text
+            content = user_attributes(rng_for_request)
+        text = json.dumps(content)
+        prompt_tokens = estimate_tokens(messages)
+        completion_tokens = len(text) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        completion = {
+            "id": f"chatcmpl-fake{rng_for_request.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text, "refusal": None},
+                "finish_reason": "stop",
+                "logprobs": None
+            }],
+            "usage": usage
+        }
+        if streamed:
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                stream_chunks(text, completion, usage, delay * (1 - FIRST_TOKEN_FRACTION), include_usage),
+                media_type="text/event-stream"
+            )
+        return completion
+
+    @app.get("/search")
+    async def search(request: Request):
+        failure = await simulate("serpapi")
+        if failure is not None:
+            return failure
+        query = request.query_params.get("q", "")
+        count = int(request.query_params.get("num", "20"))
+        return {
+            "search_metadata": {"status": "Success"},
+            "search_parameters": {"engine": request.query_params.get("engine", "google_shopping"), "q": query},
+            "shopping_results": shopping_results(query, count, request_rng(query))
+        }
+
+    @app.post("/flux")
+    async def flux():
+        failure = await simulate("flux")
+        if failure is not None:
+            return failure
+        return Response(content=image_bytes, media_type="image/png")
+
+    @app.get("/stats")
+    async def stats():
+        return counts
+
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--openai-latency", default="2500:0.35", help="median ms[:sigma] for chat completions")
+    parser.add_argument("--serpapi-latency", default="900:0.5", help="median ms[:sigma] for shopping searches")
+    parser.add_argument("--flux-latency", default="6000:0.25", help="median ms[:sigma] for image generation")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--serpapi-error-rate", type=float, default=0.0)
+    parser.add_argument("--flux-error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures, e.g. 429")
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    profiles = {}
+    for service in ("openai", "serpapi", "flux"):
+        profiles[service] = parse_latency(getattr(args, f"{service}_latency"))
+        profiles[service].error_rate = getattr(args, f"{service}_error_rate")
+
+    app = create_app(profiles, error_status=args.error_status, image_size=args.image_size, seed=args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
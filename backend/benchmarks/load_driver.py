@@ -0,0 +1,305 @@
+"""
+Load driver for the backend API.
+
+Sends a fixed number of requests per endpoint at a fixed concurrency and
+reports throughput, p50/p95/p99 latency (full response and time to first
+byte), errors, and the event loop lag the backend recorded while that
+endpoint was under load (scraped from GET /metrics).
+
+Inputs are drawn from a pool of --distinct-inputs variations, so the
+share of repeated requests (and with it the cache hit rate) is controlled;
+use 0 to draw a fresh variation for every request.
+
+With --spawn, starts benchmarks.fake_upstreams and the backend as
+subprocesses wired to each other, so a full run needs no API keys or
+network. Arguments the driver doesn't know are passed on to the fake
+upstreams (e.g. --serpapi-latency 300:0.5 --openai-error-rate 0.02).
+
+Usage (from backend/):
+    python -m benchmarks.load_driver --spawn [--endpoints search,recommendations]
+        [--requests 200] [--concurrency 16] [--distinct-inputs 50] [--json results.json]
+    python -m benchmarks.load_driver --target http://127.0.0.1:8000 [...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+FITS = ["oversized", "relaxed", "tailored", "cropped", "high-waisted", "wide-leg", "slim fit", ""]
+COLORS = ["cream", "black", "navy blue", "olive", "white", "charcoal", "camel", "sage green", "burgundy"]
+MATERIALS = ["wool", "linen", "cotton", "denim", "leather", "cashmere", "cable-knit", "silk", ""]
+GARMENTS = ["sweater", "trousers", "shirt", "jeans", "boots", "blazer", "midi skirt", "coat", "loafers", "t-shirt"]
+STYLE_REQUESTS = [
+    "minimalist office wear", "relaxed weekend outfits", "something for a summer wedding",
+    "cozy winter layers", "90s inspired streetwear", "smart casual for dinners out", "coastal vacation looks"
+]
+BUDGETS = ["low", "medium", "high"]
+
+LAG_METRIC = "fashion_event_loop_lag_seconds"
+_BUCKET_RE = re.compile(LAG_METRIC + r'_bucket\{le="([^"]+)"\} (\S+)')
+_SUM_RE = re.compile(LAG_METRIC + r"_sum (\S+)")
+
+ENDPOINTS = ("search", "batch", "recommendations", "stream")
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def search_query(rng: random.Random) -> str:
+    words = [rng.choice(FITS), rng.choice(COLORS), rng.choice(MATERIALS), rng.choice(GARMENTS)]
+    return " ".join(word for word in words if word)
+
+def profile_photo(seed: int) -> bytes:
+    # A small distinct JPEG per seed; the photo hash is part of the backend's cache keys
+    image = Image.new("RGB", (640, 800), ((seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+class RequestFactory:
+    """
+    Builds httpx request arguments for an endpoint from a pool of input variations.
+    """
+
+    def __init__(self, distinct_inputs: int, with_photos: bool, seed: int):
+        self.distinct_inputs = distinct_inputs
+        self.with_photos = with_photos
+        self.rng = random.Random(seed)
+        self._counter = 0
+
+    def _variant(self) -> int:
+        self._counter += 1
+        if self.distinct_inputs <= 0:
+            return self._counter
+        return self.rng.randrange(self.distinct_inputs)
+
+    def build(self, endpoint: str) -> Tuple[str, str, Dict[str, Any]]:
+        variant = self._variant()
+        rng = random.Random(variant)
+        if endpoint == "search":
+            return "POST", "/api/search", {"json": {"query": search_query(rng)}}
+        if endpoint == "batch":
+            return "POST", "/api/search/batch", {"json": {"queries": [search_query(rng) for _ in range(6)]}}
+
+        data = {
+            "additional_info": f"{rng.choice(STYLE_REQUESTS)} (variant {variant})",
+            "budget": rng.choice(BUDGETS),
+            "include_products": "true"
+        }
+        files = {"profile_photo": ("profile.jpg", profile_photo(variant), "image/jpeg")} if self.with_photos else None
+        path = "/api/recommendations" if endpoint == "recommendations" else "/api/recommendations/stream"
+        return "POST", path, {"data": data, "files": files}
+
+async def scrape_lag(client: httpx.AsyncClient) -> Optional[Tuple[Dict[float, float], float]]:
+    """
+    Return the event loop lag histogram (cumulative bucket counts and sum) from
+    /metrics, or None if the backend doesn't expose metrics.
+    """
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    buckets = {float(bound): float(count) for bound, count in _BUCKET_RE.findall(response.text)}
+    total = _SUM_RE.search(response.text)
+    # No samples yet (the monitor's first wakeup is still pending) reads as an empty histogram
+    return buckets, float(total.group(1)) if total else 0.0
+
+def lag_summary(before, after) -> Dict[str, Optional[float]]:
+    # Histogram deltas give the lag samples taken during this phase; quantiles are bucket upper bounds
+    if before is None or after is None:
+        return {"samples": 0, "mean_ms": None, "p99_ms": None}
+    bounds = sorted(after[0])
+    if not bounds:
+        return {"samples": 0, "mean_ms": None, "p99_ms": None}
+    counts = [after[0][bound] - before[0].get(bound, 0.0) for bound in bounds]
+    samples = counts[-1] if counts else 0
+    if not samples:
+        return {"samples": 0, "mean_ms": None, "p99_ms": None}
+    p99 = next(bound for bound, count in zip(bounds, counts) if count >= 0.99 * samples)
+    return {
+        "samples": int(samples),
+        "mean_ms": round((after[1] - before[1]) / samples * 1000, 2),
+        "p99_ms": None if p99 == float("inf") else round(p99 * 1000, 1)
+    }
+
+async def run_phase(client: httpx.AsyncClient, factory: RequestFactory, endpoint: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Send `requests` requests to one endpoint with `concurrency` workers.
+
+    Returns:
+        Dict: Throughput, latency percentiles, errors and event loop lag
+    """
+    latencies: List[float] = []
+    first_bytes: List[float] = []
+    errors: Dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            method, path, kwargs = factory.build(endpoint)
+            started = time.perf_counter()
+            first_byte = None
+            try:
+                async with client.stream(method, path, **kwargs) as response:
+                    async for chunk in response.aiter_bytes():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - started
+                        # The stream endpoint reports failures as an SSE error event with a 200 status
+                        if endpoint == "stream" and b"event: error" in chunk:
+                            errors["sse_error"] = errors.get("sse_error", 0) + 1
+                    if response.status_code >= 400:
+                        errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            first_bytes.append(first_byte if first_byte is not None else latencies[-1])
+
+    lag_before = await scrape_lag(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lag_after = await scrape_lag(client)
+
+    return {
+        "endpoint": endpoint,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {name: round(percentile(latencies, q) * 1000, 1) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "first_byte_ms": {name: round(percentile(first_bytes, q) * 1000, 1) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "event_loop_lag": lag_summary(lag_before, lag_after)
+    }
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    header = f"{'endpoint':<16}{'reqs':>6}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttfb p50':>10}{'lag mean':>10}{'lag p99':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        lag = result["event_loop_lag"]
+        print(
+            f"{result['endpoint']:<16}{result['requests']:>6}{sum(result['errors'].values()):>8}"
+            f"{result['throughput_rps']:>9.1f}{result['latency_ms']['p50']:>10.0f}{result['latency_ms']['p95']:>10.0f}"
+            f"{result['latency_ms']['p99']:>10.0f}{result['first_byte_ms']['p50']:>10.0f}"
+            f"{lag['mean_ms'] if lag['mean_ms'] is not None else '-':>10}"
+            f"{lag['p99_ms'] if lag['p99_ms'] is not None else '-':>9}"
+        )
+        if result["errors"]:
+            print(f"{'':<16}errors: {result['errors']}")
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} during startup")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout:.0f}s")
+
+@contextmanager
+def spawned_stack(app_port: int, upstream_port: int, upstream_args: List[str]):
+    """
+    Run the fake upstreams and the backend, wired together, for the duration of the block.
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "benchmark",
+        "SERPAPI_API_KEY": "benchmark",
+        "HUGGINGFACE_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{upstream_url}/v1",
+        "SERPAPI_BASE_URL": f"{upstream_url}/search",
+        "HF_INFERENCE_BASE_URL": f"{upstream_url}/flux",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")
+    }
+    processes = []
+    try:
+        upstreams = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(upstream_port), *upstream_args],
+            cwd=backend_dir, env=env
+        )
+        processes.append(upstreams)
+        wait_until_ready(f"{upstream_url}/stats", upstreams)
+        backend = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning"],
+            cwd=backend_dir, env=env
+        )
+        processes.append(backend)
+        wait_until_ready(f"http://127.0.0.1:{app_port}/", backend)
+        yield f"http://127.0.0.1:{app_port}"
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+async def run(target: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    factory = RequestFactory(args.distinct_inputs, args.photos, args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency + 2, max_keepalive_connections=args.concurrency + 2)
+    results = []
+    async with httpx.AsyncClient(base_url=target, timeout=args.timeout, limits=limits) as client:
+        for endpoint in args.endpoints:
+            if args.warmup:
+                await run_phase(client, factory, endpoint, args.warmup, args.concurrency)
+            results.append(await run_phase(client, factory, endpoint, args.requests, args.concurrency))
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="backend base URL (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="start the fake upstreams and the backend locally")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--upstream-port", type=int, default=9100)
+    parser.add_argument("--endpoints", default="search,recommendations", help=f"comma-separated, from {', '.join(ENDPOINTS)}")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=0, help="unmeasured requests per endpoint before each phase")
+    parser.add_argument("--distinct-inputs", type=int, default=50, help="size of the input pool; 0 makes every request unique")
+    parser.add_argument("--photos", action="store_true", help="attach a profile photo to recommendation requests")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    args, upstream_args = parser.parse_known_args()
+
+    args.endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    if upstream_args and not args.spawn:
+        parser.error(f"unrecognized arguments: {' '.join(upstream_args)}")
+
+    if args.spawn:
+        with spawned_stack(args.app_port, args.upstream_port, upstream_args) as target:
+            results = asyncio.run(run(target, args))
+    else:
+        results = asyncio.run(run(args.target, args))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,106 @@
 from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Optional, Dict
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional, Dict, Tuple
 import os
+import copy
 import json
-from app.services.openai_service import generate_search_query
-from app.services.serpapi_service import search_fashion_items
-from app.services.searchapi_service import search_products
+import hashlib
+import time
+import asyncio
+import logging
+from app.services.openai_service import generate_search_query, user_attributes_cache
+from app.services.serpapi_service import search_fashion_items, prewarm_category_fallbacks
+from app.services.searchapi_service import search_products, similar_query_cache
+from app.services.outbound_scheduler import serpapi_scheduler
 import shutil
-from app.services.huggingface_service import generate_style_image
-import base64
+from app.services.huggingface_service import (
+    generate_style_image, get_style_image, style_image_hash, image_flight, style_image_cache, STYLE_IMAGE_MIME_TYPE
+)
+from app.services.http_client import init_http_client, close_http_client
+from app.services.client_registry import clients
+from app.services.serpapi_client import shopping_cache, shopping_flight, get_shopping_stats
+from app.services.catalog_service import product_catalog
+from app.utils.cache import TTLCache, make_cache_key, make_content_key
+from app.utils.single_flight import SingleFlight
+from app.utils.metrics import metrics, HTTP_REQUEST_DURATION, PAYLOAD_BYTES, track_fallbacks, track_stage
+from app.utils.logging_config import configure_logging
+from app.utils.loop_monitor import monitor_event_loop_lag
+
+configure_logging()
+logger = logging.getLogger("app.main")
+
+PREWARM_CATEGORY_FALLBACKS = os.getenv("PREWARM_CATEGORY_FALLBACKS", "false").lower() in ("1", "true", "yes")
+# Seconds between event loop lag samples; 0 disables the monitor
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+# SDK clients built in the background at startup; any others are built on first use
+PRELOAD_CLIENTS = [name.strip() for name in os.getenv("PRELOAD_CLIENTS", "openai,huggingface").split(",") if name.strip()]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Share one pooled, keep-alive HTTP client across all outbound API calls
+    app.state.http_client = await init_http_client()
+    # Import and build the SDK clients on a worker thread, so startup doesn't wait for them
+    preload_task = None
+    if PRELOAD_CLIENTS:
+        preload_task = asyncio.create_task(asyncio.to_thread(clients.preload, PRELOAD_CLIENTS))
+    # Optionally fetch the fixed category fallback queries so backfills are served from cache
+    # (only search_fashion_items backfills, and no endpoint calls it yet)
+    prewarm_task = None
+    if PREWARM_CATEGORY_FALLBACKS:
+        prewarm_task = asyncio.create_task(prewarm_category_fallbacks(client=app.state.http_client))
+    lag_task = None
+    if EVENT_LOOP_LAG_INTERVAL > 0:
+        lag_task = asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL))
+    yield
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+    if lag_task is not None:
+        lag_task.cancel()
+    if preload_task is not None:
+        await preload_task
+    await clients.aclose()
+    await close_http_client()
+    # Commits the queued disk writes
+    await asyncio.to_thread(shopping_cache.close)
+    await asyncio.to_thread(user_attributes_cache.close)
+
+app = FastAPI(lifespan=lifespan)
+
+# Limits for the batch search endpoint
+SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "6"))
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "20"))
+
+# How long clients may reuse a style image before revalidating it by ETag; short,
+# since the server can evict or prune the image well before its TTL
+STYLE_IMAGE_HTTP_MAX_AGE = int(os.getenv("STYLE_IMAGE_HTTP_MAX_AGE", "300"))
+
+# Background style image generations started for defer_image requests
+background_image_tasks = set()
+
+# Full recommendation results, keyed by a fingerprint of the form fields and photo contents
+RECOMMENDATION_CACHE_ENABLED = os.getenv("RECOMMENDATION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "3600"))
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "1024"))
+RECOMMENDATION_CACHE_MAX_BYTES = int(os.getenv("RECOMMENDATION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Fallbacks that change the result (generic style, no photo attributes, empty product
+# lists); a result built with any of them is not cached, so the next request retries
+DEGRADED_FALLBACKS = {"default_recommendations", "empty_user_attributes", "empty_product_results"}
 
-app = FastAPI()
+recommendation_cache = TTLCache(
+    "recommendations",
+    max_entries=RECOMMENDATION_CACHE_MAX_ENTRIES,
+    ttl=RECOMMENDATION_CACHE_TTL,
+    max_bytes=RECOMMENDATION_CACHE_MAX_BYTES
+)
+
+# Double-clicked submissions share one pipeline run
+recommendation_flight = SingleFlight("recommendations")
+
+# Stream the style completion and search each item's products as soon as the item is generated,
+# overlapping the searches with the rest of the generation
+INCREMENTAL_PRODUCT_SEARCH = os.getenv("INCREMENTAL_PRODUCT_SEARCH", "true").lower() in ("1", "true", "yes")
 
 # Configure CORS
 app.add_middleware(
@@ -22,10 +111,234 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep the series count bounded.
+    # For streamed responses this measures time to the first byte.
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code)
+    )
+    return response
+
+def collect_component_metrics():
+    """
+    Export cache, coalescing and scheduler statistics the components already keep.
+    """
+    caches = [
+        shopping_cache.stats(),
+        user_attributes_cache.stats(),
+        recommendation_cache.stats(),
+        style_image_cache.stats(),
+        similar_query_cache.stats()
+    ]
+    yield "fashion_cache_hits_total", "counter", "Cache hits", [({"cache": stats["name"]}, stats["hits"]) for stats in caches]
+    yield "fashion_cache_misses_total", "counter", "Cache misses", [({"cache": stats["name"]}, stats["misses"]) for stats in caches]
+    yield "fashion_cache_hit_ratio", "gauge", "Cache hit ratio since startup", [({"cache": stats["name"]}, stats["hit_ratio"]) for stats in caches]
+    yield "fashion_cache_entries", "gauge", "Entries held in memory", [({"cache": stats["name"]}, stats["entries"]) for stats in caches]
+
+    catalog = product_catalog.stats()
+    yield "fashion_catalog_products", "gauge", "Products in the local catalog", [({}, catalog["products"])]
+    yield "fashion_catalog_lookups_total", "counter", "Product searches checked against the local catalog", [({}, catalog["lookups"])]
+    yield "fashion_catalog_hits_total", "counter", "Product searches answered from the local catalog", [({}, catalog["local_hits"])]
+
+    flights = [shopping_flight.stats(), image_flight.stats(), recommendation_flight.stats()]
+    yield "fashion_single_flight_coalesced_total", "counter", "Calls that joined an identical in-flight call", [({"flight": stats["name"]}, stats["coalesced"]) for stats in flights]
+
+    scheduler = serpapi_scheduler.stats()
+    yield "fashion_outbound_queue_depth", "gauge", "Requests waiting for an outbound slot", [({"upstream": scheduler["name"]}, scheduler["queue_depth"])]
+    yield "fashion_outbound_in_flight", "gauge", "Outbound requests in flight", [({"upstream": scheduler["name"]}, scheduler["in_flight"])]
+
+metrics.register_collector(collect_component_metrics)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Fashion Perplexity API"}
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        "shopping": get_shopping_stats(),
+        "similar_queries": similar_query_cache.stats(),
+        "catalog": product_catalog.stats(),
+        "user_attributes": user_attributes_cache.stats(),
+        "recommendations": {
+            "cache": recommendation_cache.stats(),
+            "single_flight": recommendation_flight.stats()
+        },
+        "style_images": {
+            "cache": style_image_cache.stats(),
+            "single_flight": image_flight.stats()
+        }
+    }
+
+async def parse_recommendation_form(request: Request) -> Dict:
+    """
+    Read the recommendation form and build the user_input dict expected by
+    generate_search_query. Photos are passed on as bytes; nothing is written
+    to disk (Starlette already spools large uploads to temporary files and
+    UploadFile.read offloads reading those to a thread).
+    """
+    # Parse the form data
+    form_data = await request.form()
+    
+    # Extract fields
+    additional_info = form_data.get("additional_info", "")
+    budget = form_data.get("budget", "medium")
+    
+    logger.debug("Extracted fields: additional_info=%s, budget=%s", additional_info, budget)
+    
+    # Process user photo (single photo)
+    profile_photo = None
+    if "profile_photo" in form_data and hasattr(form_data["profile_photo"], "filename"):
+        profile_photo = await form_data["profile_photo"].read()
+        PAYLOAD_BYTES.observe(len(profile_photo), kind="profile_photo_upload")
+    
+    # Process inspiration/aesthetic photos (multiple photos)
+    aesthetic_photos = []
+    index = 0
+    while True:
+        key = f"inspiration_images[{index}]"
+        if key not in form_data or not hasattr(form_data[key], "filename"):
+            break
+        aesthetic_photos.append(await form_data[key].read())
+        PAYLOAD_BYTES.observe(len(aesthetic_photos[-1]), kind="aesthetic_photo_upload")
+        index += 1
+    
+    logger.debug("Received %d user photo and %d aesthetic photos", 1 if profile_photo else 0, len(aesthetic_photos))
+    
+    return {
+        "additional_info": additional_info,
+        "budget": budget,
+        "profile_photo": profile_photo,
+        "aesthetic_photos": aesthetic_photos
+    }
+
+def recommendation_cache_key(user_input: Dict, include_products: bool) -> str:
+    """
+    Fingerprint a recommendation request: the form fields plus content hashes
+    of the uploaded photos, so re-uploads of the same files match.
+    """
+    profile_photo = user_input.get("profile_photo")
+    return make_cache_key({
+        "additional_info": user_input.get("additional_info", ""),
+        "budget": user_input.get("budget", ""),
+        "profile_photo": make_content_key([profile_photo]) if profile_photo else None,
+        "aesthetic_photos": make_content_key(user_input.get("aesthetic_photos", [])),
+        "include_products": include_products
+    })
+
+class ProductSearches:
+    """
+    Product search tasks keyed by item description, so an item's search can
+    start while the model is still generating the remaining items and be
+    picked up again once the full response is in.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, item: Dict) -> asyncio.Task:
+        """
+        Start the search for an item, or return the one already running for its description.
+        """
+        task = self.tasks.get(item["description"])
+        if task is None:
+            task = asyncio.create_task(search_products(item["description"], client=self.client, canonicalize=True))
+            self.tasks[item["description"]] = task
+        return task
+
+    def for_items(self, items: List[Dict]) -> List[asyncio.Task]:
+        """
+        Return one search task per item, cancelling streamed searches for items
+        that didn't make it into the final response (e.g. after a fallback).
+        """
+        tasks = [self.start(item) for item in items]
+        wanted = {item["description"] for item in items}
+        for description, task in self.tasks.items():
+            if description not in wanted:
+                task.cancel()
+        return tasks
+
+    def cancel(self) -> None:
+        for task in self.tasks.values():
+            task.cancel()
+
+async def generate_recommendations(user_input: Dict, searches: Optional[ProductSearches]) -> Dict:
+    """
+    Generate the style and items, starting product searches for each item as
+    it streams out of the model when searches are wanted.
+    """
+    on_item = searches.start if searches is not None and INCREMENTAL_PRODUCT_SEARCH else None
+    try:
+        return await generate_search_query(user_input, on_item=on_item)
+    except BaseException:
+        if searches is not None:
+            searches.cancel()
+        raise
+
+async def build_recommendations(user_input: Dict, include_products: bool, client) -> Tuple[Dict, List[str]]:
+    """
+    Run the recommendation pipeline: style analysis with product searches
+    starting as items are generated, while the style image renders in the
+    background.
+    
+    Returns:
+        Tuple: (recommendations, DEGRADED_FALLBACKS kinds taken while building them)
+    """
+    searches = ProductSearches(client) if include_products else None
+    with track_fallbacks() as fallbacks:
+        recommendations = await generate_recommendations(user_input, searches)
+        schedule_style_image(recommendations)
+        
+        if searches is not None:
+            # Only the wait left after generation; the searches may have started long before
+            try:
+                with track_stage("product_search"):
+                    product_results = await asyncio.gather(*searches.for_items(recommendations["items"]))
+            finally:
+                searches.cancel()
+            for item, products in zip(recommendations["items"], product_results):
+                item["products"] = products
+    
+    return recommendations, sorted(set(fallbacks) & DEGRADED_FALLBACKS)
+
+def form_flag(value) -> bool:
+    """
+    Interpret an optional boolean form field ("true", "1", "yes", "on").
+    """
+    return str(value or "").strip().lower() in ("1", "true", "yes", "on")
+
+def schedule_style_image(recommendations: Dict) -> str:
+    """
+    Start style image generation in the background and return its hash for
+    fetching later from GET /api/images/{hash}.
+    """
+    task = asyncio.create_task(generate_style_image(recommendations))
+    background_image_tasks.add(task)
+    task.add_done_callback(background_image_tasks.discard)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception() is None or logger.error("Style image generation failed: %s", t.exception()))
+    return style_image_hash(recommendations)
+
+def style_image_url(request: Request, image_hash: str) -> str:
+    return str(request.url_for("get_image", image_hash=image_hash))
+
+def format_sse(event: str, data: Dict) -> str:
+    """
+    Encode one Server-Sent Events message.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/api/recommendations")
 async def search_fashion(
     request: Request,
@@ -33,97 +346,143 @@ async def search_fashion(
     budget: Optional[str] = Form("medium")
 ):
     try:
-        # Parse the form data
+        # Read uploaded photos and build the OpenAI input
+        user_input = await parse_recommendation_form(request)
+        
         form_data = await request.form()
-        print(f"Received request with form data: {form_data}")
-        
-        # Extract fields
-        additional_info = form_data.get("additional_info", "")
-        budget = form_data.get("budget", "medium")
-        
-        print(f"Extracted fields: additional_info={additional_info}, budget={budget}")
-        
-        # Create temp directories for uploaded images if they don't exist
-        temp_dir = os.path.join(os.path.dirname(__file__), "temp")
-        profile_photos_dir = os.path.join(temp_dir, "profile_photos")
-        aesthetic_photos_dir = os.path.join(temp_dir, "aesthetic_photos")
-        
-        os.makedirs(temp_dir, exist_ok=True)
-        os.makedirs(profile_photos_dir, exist_ok=True)
-        os.makedirs(aesthetic_photos_dir, exist_ok=True)
-        
-        # Process user photo (single photo)
-        profile_photo_path = None
-        if "profile_photo" in form_data and hasattr(form_data["profile_photo"], "filename"):
-            photo = form_data["profile_photo"]
-            file_path = os.path.join(profile_photos_dir, f"profile_photo_{photo.filename}")
-            with open(file_path, "wb") as f:
-                content = await photo.read()
-                f.write(content)
-            profile_photo_path = file_path
-            print(f"Saved user photo to {file_path}")
-        
-        # Process inspiration/aesthetic photos (multiple photos)
-        aesthetic_photo_paths = []
-        index = 0
-        while True:
-            key = f"inspiration_images[{index}]"
-            if key not in form_data or not hasattr(form_data[key], "filename"):
-                break
-            photo = form_data[key]
-            file_path = os.path.join(aesthetic_photos_dir, f"inspiration_{photo.filename}")
-            with open(file_path, "wb") as f:
-                content = await photo.read()
-                f.write(content)
-            aesthetic_photo_paths.append(file_path)
-            print(f"Saved inspiration photo to {file_path}")
-            index += 1
-        
-        print(f"Processed 1 user photo and {len(aesthetic_photo_paths)} aesthetic photos")
-        
-        # Generate search queries using OpenAI
-        user_input = {
-            "additional_info": additional_info,
-            "budget": budget,
-            "profile_photo_path": profile_photo_path,
-            "aesthetic_photo_paths": aesthetic_photo_paths
-        }
+        include_products = form_flag(form_data.get("include_products"))
+        defer_image = form_flag(form_data.get("defer_image"))
+        # regenerate=true skips the cache and replaces the stored result
+        regenerate = form_flag(form_data.get("regenerate"))
+        client = request.app.state.http_client
         
-        # Get fashion recommendations from OpenAI
-        recommendations = await generate_search_query(user_input)
+        cache_key = recommendation_cache_key(user_input, include_products)
+        recommendations = None
+        if RECOMMENDATION_CACHE_ENABLED and not regenerate:
+            recommendations = recommendation_cache.get(cache_key)
+        cache_hit = recommendations is not None
         
-        # Generate style image
-        style_image = await generate_style_image(recommendations)
-        base64_image = base64.b64encode(style_image).decode("utf-8")
+        if cache_hit:
+            logger.info("Recommendation cache hit: %s", cache_key[:12])
+        else:
+            # Get fashion recommendations from OpenAI (and products, if requested)
+            if regenerate:
+                recommendations, degraded = await build_recommendations(user_input, include_products, client)
+            else:
+                recommendations, degraded = await recommendation_flight.do(
+                    cache_key,
+                    lambda: build_recommendations(user_input, include_products, client)
+                )
+            if degraded:
+                # A transient upstream failure must not pin a fallback result to this input
+                logger.info("Not caching degraded recommendations %s (%s)", cache_key[:12], ", ".join(degraded))
+            elif RECOMMENDATION_CACHE_ENABLED:
+                recommendation_cache.set(cache_key, recommendations)
         
-        # Add base64 image to recommendations
-        recommendations["style"]["image"] = f"data:image/png;base64,{base64_image}"
+        # The cached copy is shared; the image URL depends on this request's host
+        recommendations = copy.deepcopy(recommendations)
         
-        # Clean up temporary files
-        if profile_photo_path:
-            try:
-                os.remove(profile_photo_path)
-                print(f"Removed temporary file: {profile_photo_path}")
-            except Exception as e:
-                print(f"Error removing temporary file {profile_photo_path}: {str(e)}")
-        for path in aesthetic_photo_paths:
-            try:
-                os.remove(path)
-                print(f"Removed temporary file: {path}")
-            except Exception as e:
-                print(f"Error removing temporary file {path}: {str(e)}")
+        if defer_image:
+            # Return right away; GET /api/images/{hash} waits for the generation to finish.
+            # A cached result's image may have expired since, so make sure it exists again.
+            image_hash = schedule_style_image(recommendations) if cache_hit else style_image_hash(recommendations)
+        else:
+            # Already rendering since build_recommendations; returns at once when cached
+            image_hash = await generate_style_image(recommendations)
+        # Link to the image instead of inlining it; the endpoint serves it with caching headers
+        recommendations["style"]["image"] = style_image_url(request, image_hash)
         
         # Return the recommendations directly
         return recommendations
         
     except Exception as e:
-        import traceback
-        print(f"Error in search_fashion: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in search_fashion: %s", e)
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": str(e)}
+        )
+
+@app.post("/api/recommendations/stream")
+async def search_fashion_stream(request: Request):
+    """
+    Streaming variant of /api/recommendations. Emits Server-Sent Events as each
+    stage finishes: "style" (style block and items), one "products" event per
+    item, "image" (generated style image) and finally "done". Failures are
+    reported as an "error" event.
+    """
+    # Read the uploads before the response starts; the request body can't be read afterwards
+    user_input = await parse_recommendation_form(request)
+    client = request.app.state.http_client
+    
+    async def event_stream():
+        tasks = []
+        searches = ProductSearches(client)
+        try:
+            recommendations = await generate_recommendations(user_input, searches)
+            yield format_sse("style", recommendations)
+            
+            # Generate the style image in parallel with the product searches
+            image_task = asyncio.create_task(generate_style_image(recommendations))
+            tasks.append(image_task)
+            
+            # Emit each item's products as its search resolves; most started while the items were generated
+            async def search_item(index: int, search: asyncio.Task):
+                return index, await search
+            
+            search_tasks = [
+                asyncio.create_task(search_item(index, search))
+                for index, search in enumerate(searches.for_items(recommendations["items"]))
+            ]
+            tasks += search_tasks
+            for next_result in asyncio.as_completed(search_tasks):
+                index, products = await next_result
+                item = recommendations["items"][index]
+                yield format_sse("products", {
+                    "index": index,
+                    "description": item["description"],
+                    "category": item["category"],
+                    "results": products
+                })
+            
+            image_hash = await image_task
+            yield format_sse("image", {"image": style_image_url(request, image_hash)})
+            
+            yield format_sse("done", {"success": True})
+        except Exception as e:
+            logger.exception("Error in search_fashion_stream: %s", e)
+            yield format_sse("error", {"success": False, "error": str(e)})
+        finally:
+            # Stop outstanding searches if the client disconnected mid-stream
+            for task in tasks:
+                task.cancel()
+            searches.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/images/{image_hash}")
+async def get_image(image_hash: str, request: Request):
+    try:
+        style_image = await get_style_image(image_hash)
+    except Exception as e:
+        logger.error("Error generating style image %s: %s", image_hash, e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)}
         )
+    if style_image is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired image")
+    # The hash names the prompt; once the cached image expires the same prompt
+    # generates a different image, so the ETag comes from the bytes and the
+    # response is not immutable
+    etag = f'"{hashlib.sha256(style_image).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={STYLE_IMAGE_HTTP_MAX_AGE}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=style_image, media_type=STYLE_IMAGE_MIME_TYPE, headers=headers)
 
 @app.post("/api/search")
 async def search(request: Request):
@@ -134,14 +493,59 @@ async def search(request: Request):
         if not query:
             raise HTTPException(status_code=400, detail="Query parameter is required")
             
-        results = await search_products(query)
+        results = await search_products(query, client=request.app.state.http_client)
         
         return {
             "results": results
         }
         
     except Exception as e:
-        print(f"Error in search: {str(e)}")
+        logger.error("Error in search: %s", e)
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": str(e)}
+        )
+
+@app.post("/api/search/batch")
+async def search_batch(request: Request):
+    try:
+        body = await request.json()
+        queries = body.get("queries")
+        # Set for generated item descriptions; queries typed by users are searched as they are
+        canonicalize = body.get("canonicalize") is True
+        
+        if not isinstance(queries, list) or not queries:
+            raise HTTPException(status_code=400, detail="queries must be a non-empty list of strings")
+        
+        # Deduplicate identical queries while keeping request order
+        unique_queries = list(dict.fromkeys(
+            query.strip() for query in queries if isinstance(query, str) and query.strip()
+        ))
+        if not unique_queries:
+            raise HTTPException(status_code=400, detail="queries must be a non-empty list of strings")
+        if len(unique_queries) > SEARCH_BATCH_MAX_QUERIES:
+            raise HTTPException(status_code=400, detail=f"At most {SEARCH_BATCH_MAX_QUERIES} queries are allowed per batch")
+        
+        logger.debug("Batch search for %d unique queries (%d requested)", len(unique_queries), len(queries))
+        
+        # Run the searches concurrently, bounded so one batch can't flood the upstream API
+        semaphore = asyncio.Semaphore(SEARCH_BATCH_CONCURRENCY)
+        client = request.app.state.http_client
+        
+        async def run_query(query: str):
+            async with semaphore:
+                return query, await search_products(query, client=client, canonicalize=canonicalize)
+        
+        results = await asyncio.gather(*(run_query(query) for query in unique_queries))
+        
+        return {
+            "results": {query: products for query, products in results}
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in search_batch: %s", e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)}
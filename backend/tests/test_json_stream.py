@@ -0,0 +1,41 @@
+import json
+
+from app.utils.json_stream import JsonArrayStream
+
+DOCUMENT = json.dumps({
+    "style": {"title": "Smart \"Casual\" items", "description": "A look with items: {not an array} [or this]"},
+    "note": "items",
+    "items": [
+        {"category": "tops", "description": "Cream cable-knit sweater, \"items\": [1]"},
+        {"category": "bottoms", "description": "Wide leg trousers", "details": {"items": [{"nested": True}]}},
+        {"category": "shoes", "description": "Leather loafers \\ with a backslash"}
+    ],
+    "tags": ["items", {"category": "not an item"}]
+})
+
+EXPECTED = json.loads(DOCUMENT)["items"]
+
+def feed_in_chunks(size: int) -> list:
+    stream = JsonArrayStream("items")
+    elements = []
+    for start in range(0, len(DOCUMENT), size):
+        elements.extend(stream.feed(DOCUMENT[start:start + size]))
+    return elements
+
+def test_whole_document():
+    assert feed_in_chunks(len(DOCUMENT)) == EXPECTED
+
+def test_elements_split_across_chunk_boundaries():
+    for size in (1, 2, 3, 7, 16, 64):
+        assert feed_in_chunks(size) == EXPECTED, size
+
+def test_elements_are_reported_as_soon_as_they_close():
+    stream = JsonArrayStream("items")
+    end_of_first = DOCUMENT.index("}", DOCUMENT.index('"items": [')) + 1
+    assert stream.feed(DOCUMENT[:end_of_first - 1]) == []
+    assert stream.feed(DOCUMENT[end_of_first - 1:end_of_first]) == EXPECTED[:1]
+
+def test_key_inside_string_values_is_not_the_array():
+    document = json.dumps({"summary": "items", "other": [{"a": 1}], "text": "\"items\": [{\"b\": 2}]"})
+    stream = JsonArrayStream("items")
+    assert stream.feed(document) == []
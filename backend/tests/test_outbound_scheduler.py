@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from app.services.outbound_scheduler import (
+    OutboundScheduler, PRIORITY_BACKFILL, PRIORITY_DEFAULT, PRIORITY_INTERACTIVE
+)
+
+def test_queued_requests_are_dispatched_by_priority():
+    scheduler = OutboundScheduler("test", rate=0, burst=1, max_in_flight=1)
+    order = []
+
+    async def request(name: str, priority: int):
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    async def run():
+        # Hold the only slot so everything else queues
+        await scheduler.acquire()
+        tasks = []
+        for name, priority in [("backfill", PRIORITY_BACKFILL), ("default", PRIORITY_DEFAULT), ("interactive", PRIORITY_INTERACTIVE), ("default 2", PRIORITY_DEFAULT)]:
+            tasks.append(asyncio.create_task(request(name, priority)))
+            await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    # Same priority keeps arrival order
+    assert order == ["interactive", "default", "default 2", "backfill"]
+
+def test_in_flight_cap_is_respected():
+    scheduler = OutboundScheduler("test", rate=0, burst=1, max_in_flight=2)
+    in_flight = 0
+    peak = 0
+
+    async def request():
+        nonlocal in_flight, peak
+        async with scheduler.slot():
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(8)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert scheduler.granted[PRIORITY_DEFAULT] == 8
+
+def test_rate_limit_spaces_requests_after_the_burst():
+    scheduler = OutboundScheduler("test", rate=20, burst=2, max_in_flight=10)
+
+    async def run():
+        started = time.monotonic()
+        for _ in range(6):
+            async with scheduler.slot():
+                pass
+        return time.monotonic() - started
+
+    # Two from the burst, then four at 20 per second
+    assert asyncio.run(run()) >= 0.18
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    scheduler = OutboundScheduler("test", rate=0, burst=1, max_in_flight=1)
+
+    async def run():
+        await scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        scheduler.release()
+        # The slot is free again for the next caller
+        await asyncio.wait_for(scheduler.acquire(), 1.0)
+        scheduler.release()
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import pytest
+
+from app.services.query_canonicalizer import canonicalize_query
+
+@pytest.mark.parametrize("description, expected", [
+    # The garment is the head noun, not an earlier modifier
+    ("Short sleeve white linen shirt", "white linen short sleeve shirt"),
+    ("Top-stitched navy wool coat", "navy wool top stitched coat"),
+    ("Black leather top-handle bag with gold hardware", "black leather top handle bag"),
+    ("Flat ankle boots in tan suede", "tan suede flat ankle boots"),
+    ("Low heel leather mules", "leather low heel mules"),
+    # Brands, models and patterns outside the vocabulary are kept
+    ("floral print wrap dress", "floral wrap dress"),
+    ("Levi 501 jeans", "levi 501 jeans"),
+    ("Nike Air Force 1 sneakers", "nike air force 1 sneakers"),
+    # Clauses after the item name and filler adjectives are dropped
+    ("A flowy lavender midi dress perfect for summer", "lavender midi dress"),
+    ("White leather sneakers, perfect for everyday wear", "white leather sneakers"),
+    ("Relaxed-fit khaki chinos for a smart casual look", "relaxed khaki chinos"),
+    ("Black tank top with lace trim", "black tank top"),
+    ("Camel wool coat and black boots", "camel wool coat"),
+    # Plural-only garments
+    ("High-waisted denim shorts", "high-waisted denim shorts"),
+    ("Black pumps with a pointed toe", "black pumps"),
+    # No garment in the vocabulary
+    ("Gold hoop earrings", "gold hoop earrings"),
+])
+def test_canonical_text(description, expected):
+    assert canonicalize_query(description).text == expected
+
+def test_paraphrases_share_a_key():
+    first = canonicalize_query("Cream cable-knit oversized sweater")
+    second = canonicalize_query("An oversized cream cable knit sweater, perfect for layering")
+    assert first.key == second.key
+
+def test_garment_and_category():
+    query = canonicalize_query("Top-stitched navy wool coat")
+    assert (query.garment, query.category) == ("coat", "outerwear")
+    assert canonicalize_query("Short sleeve white linen shirt").category == "tops"
+
+def test_length_without_garment_is_a_dress():
+    assert canonicalize_query("A flowing midi").text == "midi dress"
@@ -0,0 +1,52 @@
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+from app.services import searchapi_service
+from app.services.catalog_service import product_catalog
+from app.services.serpapi_client import shopping_cache
+from app.utils.similarity_cache import SimilarQueryCache
+
+def shopping_response(query: str) -> dict:
+    return {
+        "shopping_results": [
+            {"title": f"{query} {index}", "link": f"https://shop.example/{index}", "source": "Shop", "price": "$40"}
+            for index in range(10)
+        ]
+    }
+
+def run_batch(monkeypatch, body: dict) -> list:
+    upstream_queries = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        upstream_queries.append(request.url.params["q"])
+        return httpx.Response(200, content=json.dumps(shopping_response(request.url.params["q"])).encode())
+
+    monkeypatch.setattr(searchapi_service, "SEARCHAPI_KEY", "test")
+    monkeypatch.setattr(searchapi_service, "similar_query_cache", SimilarQueryCache("test"))
+    monkeypatch.setattr(product_catalog, "lookup", lambda query, k: _no_match())
+    shopping_cache.clear()
+
+    monkeypatch.setattr(main.app.state, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)), raising=False)
+    response = TestClient(main.app).post("/api/search/batch", json=body)
+    assert response.status_code == 200
+    assert set(response.json()["results"]) == set(body["queries"])
+    return upstream_queries
+
+async def _no_match():
+    return None
+
+DESCRIPTIONS = [
+    "Cream cable-knit oversized sweater",
+    "An oversized cream cable knit sweater, perfect for layering",
+]
+
+def test_descriptions_with_the_same_canonical_form_fetch_once(monkeypatch):
+    upstream_queries = run_batch(monkeypatch, {"queries": DESCRIPTIONS, "canonicalize": True})
+    assert len(upstream_queries) == 1
+
+def test_batch_searches_queries_as_typed_by_default(monkeypatch):
+    upstream_queries = run_batch(monkeypatch, {"queries": DESCRIPTIONS})
+    assert len(upstream_queries) == 2
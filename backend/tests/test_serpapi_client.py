@@ -0,0 +1,31 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services import serpapi_client
+from app.services.outbound_scheduler import OutboundScheduler
+
+def test_time_budget_covers_the_wait_for_a_slot(monkeypatch):
+    scheduler = OutboundScheduler("test", rate=100.0, burst=10, max_in_flight=1)
+    monkeypatch.setattr(serpapi_client, "serpapi_scheduler", scheduler)
+    monkeypatch.setattr(serpapi_client, "SERPAPI_TOTAL_TIMEOUT", 0.3)
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        return httpx.Response(200, json={"shopping_results": []})
+
+    async def run():
+        # Another request holds the only slot for longer than the budget
+        await scheduler.acquire()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            started = time.monotonic()
+            with pytest.raises(httpx.TimeoutException):
+                await serpapi_client.send_with_retries(client, "https://serpapi.test/search", {"q": "linen shirt"})
+            return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    assert sent == []
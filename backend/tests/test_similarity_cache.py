@@ -0,0 +1,35 @@
+from app.services.searchapi_service import similar_query_scope
+from app.utils.similarity_cache import SimilarQueryCache
+
+def make_cache() -> SimilarQueryCache:
+    return SimilarQueryCache("test", threshold=0.6)
+
+def test_near_duplicate_hit():
+    cache = make_cache()
+    cache.set("slim black wool trousers", "trousers")
+    assert cache.get("black slim-fit wool trousers") == "trousers"
+    assert cache.get("slim black wool trousers tailored") == "trousers"
+
+def test_scopes_do_not_match_each_other():
+    cache = make_cache()
+    cache.set("slim black wool trousers", "trousers", scope="trousers")
+    assert cache.get("slim black wool blazer", scope="blazer") is None
+    assert cache.get("slim black wool trouser", scope="trousers") == "trousers"
+
+def test_similar_false_only_matches_exactly():
+    cache = make_cache()
+    cache.set("gold hoop earrings small", "gold")
+    assert cache.get("silver hoop earrings small", similar=False) is None
+    assert cache.get("small gold hoop earrings", similar=False) == "gold"
+
+def test_search_scope_separates_garments_and_colors():
+    # Jaccard 0.6 on their own: one word of five differs
+    assert similar_query_scope("slim black wool trousers") != similar_query_scope("slim black wool blazer")
+    assert similar_query_scope("slim black wool trousers") != similar_query_scope("slim navy wool trousers")
+    assert similar_query_scope("slim black wool trousers") == similar_query_scope("black slim wool trousers tailored")
+    assert similar_query_scope("gold hoop earrings") is None
+
+def test_search_scope_blocks_the_garment_swap():
+    cache = make_cache()
+    cache.set("slim black wool trousers", "trousers", scope=similar_query_scope("slim black wool trousers"))
+    assert cache.get("slim black wool blazer", scope=similar_query_scope("slim black wool blazer")) is None
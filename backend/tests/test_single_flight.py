@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    executions = 0
+
+    async def work():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return {"value": executions}
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert executions == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["coalesced"] == 4
+    assert flight.get("key") is None
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+
+    async def run():
+        return await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0, "a")), flight.do("b", lambda: asyncio.sleep(0, "b")))
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert flight.stats()["executions"] == 2
+
+def test_cancelling_one_waiter_does_not_cancel_the_shared_task():
+    flight = SingleFlight("test")
+    release = None
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        shared = flight.get("key")
+
+        first.cancel()
+        await asyncio.sleep(0)
+        assert first.cancelled()
+        assert not shared.cancelled()
+
+        release.set()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+def test_exception_reaches_every_caller_and_clears_the_key():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def run():
+        results = await asyncio.gather(flight.do("key", work), flight.do("key", work), return_exceptions=True)
+        assert flight.get("key") is None
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["executions"] == 1
@@ -0,0 +1,51 @@
+import os
+import time
+
+from app.services import huggingface_service
+
+def write_file(directory, name: str, size: int, age: float) -> str:
+    path = os.path.join(str(directory), name)
+    with open(path, "wb") as image_file:
+        image_file.write(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+def test_prune_removes_expired_then_oldest(tmp_path, monkeypatch):
+    monkeypatch.setattr(huggingface_service, "STYLE_IMAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(huggingface_service, "STYLE_IMAGE_CACHE_TTL", 3600.0)
+    monkeypatch.setattr(huggingface_service, "STYLE_IMAGE_CACHE_DIR_MAX_BYTES", 250)
+    expired = write_file(tmp_path, "expired.webp", 10, 7200)
+    oldest = write_file(tmp_path, "oldest.webp", 100, 300)
+    older = write_file(tmp_path, "older.webp", 100, 200)
+    newest = write_file(tmp_path, "newest.webp", 100, 100)
+
+    assert huggingface_service.prune_disk_images() == 2
+    assert not os.path.exists(expired)
+    assert not os.path.exists(oldest)
+    assert os.path.exists(older) and os.path.exists(newest)
+
+def test_prune_keeps_everything_within_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(huggingface_service, "STYLE_IMAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(huggingface_service, "STYLE_IMAGE_CACHE_DIR_MAX_BYTES", 1024)
+    write_file(tmp_path, "a.webp", 100, 60)
+    write_file(tmp_path, "b.webp", 100, 30)
+    assert huggingface_service.prune_disk_images() == 0
+
+def test_image_response_revalidates_and_is_not_immutable(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setattr(huggingface_service, "STYLE_IMAGE_CACHE_DIR", "")
+    huggingface_service.style_image_cache.set("abc", b"image bytes")
+    client = TestClient(main.app)
+
+    response = client.get("/api/images/abc")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == f"public, max-age={main.STYLE_IMAGE_HTTP_MAX_AGE}"
+    etag = response.headers["etag"]
+    assert client.get("/api/images/abc", headers={"If-None-Match": etag}).status_code == 304
+
+    # Evicted before any TTL: revalidation finds it gone
+    huggingface_service.style_image_cache.delete("abc")
+    assert client.get("/api/images/abc", headers={"If-None-Match": etag}).status_code == 404
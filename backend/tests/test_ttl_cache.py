@@ -0,0 +1,83 @@
+import asyncio
+import sqlite3
+import time
+
+from app.utils.cache import TTLCache
+
+def make_cache(tmp_path, **kwargs) -> TTLCache:
+    # A long flush interval, so tests decide when writes reach the disk
+    return TTLCache("test", db_path=str(tmp_path / "cache.sqlite3"), flush_interval=60.0, **kwargs)
+
+def count_rows(tmp_path) -> int:
+    with sqlite3.connect(str(tmp_path / "cache.sqlite3")) as db:
+        return db.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+def test_writes_are_queued_until_flushed(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("a", {"value": 1})
+    cache.set("b", [1, 2, 3])
+    assert count_rows(tmp_path) == 0
+    assert cache.stats()["pending_writes"] == 2
+    cache.flush()
+    assert count_rows(tmp_path) == 2
+    assert cache.stats()["pending_writes"] == 0
+    cache.close()
+
+def test_close_commits_and_reopen_reads_from_disk(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("a", {"value": 1})
+    cache.close()
+
+    reopened = make_cache(tmp_path)
+    assert asyncio.run(reopened.aget("a")) == {"value": 1}
+    assert reopened.stats()["disk_hits"] == 1
+    assert asyncio.run(reopened.aget("missing", "default")) == "default"
+    reopened.close()
+
+def test_entry_evicted_before_flush_is_still_found(tmp_path):
+    cache = make_cache(tmp_path, max_entries=1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.close()
+
+def test_delete_and_clear_reach_the_disk(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.flush()
+    cache.delete("a")
+    cache.flush()
+    assert count_rows(tmp_path) == 1
+    cache.clear()
+    cache.flush()
+    assert count_rows(tmp_path) == 0
+    cache.close()
+
+def test_expired_rows_are_purged_while_running(tmp_path):
+    cache = TTLCache("test", db_path=str(tmp_path / "cache.sqlite3"), flush_interval=0.05, purge_interval=0.1)
+    cache.set("short", 1, ttl=0.05)
+    cache.set("long", 2)
+    deadline = time.monotonic() + 5
+    while cache.stats()["disk_purged"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert cache.stats()["disk_purged"] == 1
+    assert count_rows(tmp_path) == 1
+    cache.close()
+
+def test_unserializable_value_is_dropped_and_later_writes_continue(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("bad", object())
+    cache.set("good", 1)
+    cache.flush()
+    assert count_rows(tmp_path) == 1
+    assert cache.stats()["disk_write_errors"] == 1
+    assert cache.stats()["pending_writes"] == 0
+
+    cache.set("later", 2)
+    cache.flush()
+    assert count_rows(tmp_path) == 2
+    assert cache.stats()["disk_write_errors"] == 1
+    # Still served from memory
+    assert cache.get("bad") is not None
+    cache.close()
@@ -1,6 +1,6 @@
 import { allCategories } from "@/categories";
 import { FashionRecommendationResponse } from "@/services/fashionService";
-import { getSearchResultsReal, SearchResponse } from "@/services/searchService";
+import { getBatchSearchResults } from "@/services/searchService";
 import { useRouter } from "next/router";
 import { useEffect, useMemo, useState } from "react";
 import { Skeleton } from "../components/ui/skeleton";
@@ -50,17 +50,17 @@ export default function ResultsPage() {
 
       setIsSearching(true);
 
-      const results: SearchResultWithCategory[] = await Promise.all(
-        recommendation.items.map(async item => {
-          const r: SearchResponse = await getSearchResultsReal(item.description);
-          console.log('result', r);
-          return {
-            ...r.results[0],
-            category: item.category
-          }
-        })
+      // Generated descriptions: the backend searches their short canonical form
+      const batch = await getBatchSearchResults(
+        recommendation.items.map(item => item.description),
+        true
       );
 
+      const results: SearchResultWithCategory[] = recommendation.items.map(item => ({
+        ...(batch.results[item.description.trim()] || [])[0],
+        category: item.category
+      }));
+
       console.log('results', results);
 
       setCategoryResults(results.reduce((acc, curr) => {
@@ -13,6 +13,10 @@ export interface SearchResponse {
       query: string;
   }
 
+  export interface BatchSearchResponse {
+    results: Record<string, SearchResult[]>;
+  }
+
 export async function getSearchResults(query: string): Promise<SearchResponse> {
   await new Promise(resolve => setTimeout(resolve, 500));
 
@@ -57,4 +61,20 @@ export async function getSearchResultsReal(query: string): Promise<SearchRespons
   }
   
   return await response.json();
-}
\ No newline at end of file
+}
+
+export async function getBatchSearchResults(queries: string[], canonicalize = false): Promise<BatchSearchResponse> {
+  const response = await fetch('http://localhost:8000/api/search/batch', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ queries, canonicalize })
+  });
+
+  if (!response.ok) {
+    throw new Error(`Batch search request failed: ${response.statusText}`);
+  }
+
+  return await response.json();
+}